@@ -24,7 +24,7 @@ try:
     else:
       initial = 4
 
-    Shifter1.shiftByte(1<<walk)
+    Shifter1.write(1<<walk) # skip the shift if the LED didn't move
     time.sleep(0.05) #0.05 seconds
 
   
@@ -12,8 +12,10 @@ GPIO.setup(clockPin, GPIO.OUT, initial=0)
 pattern = 0b01100110        # 8-bit pattern to display on LED bar
 
 def ping(p):
+  # No sleep(0) between edges: that yields to the scheduler on every pulse.
+  # A GPIO.output() call alone lasts far longer than the 74HC595's ~75 ns
+  # minimum pulse width, so the pulse is already wide enough.
   GPIO.output(p,1)
-  time.sleep(0)
   GPIO.output(p,0)
 
 def shiftByte(b): # send a byte of data to the output
@@ -18,10 +18,14 @@ class Shifter:
        GPIO.setup(self.clockPin, GPIO.OUT, initial=0)  
        
        pattern = 0b01100110        # 8-bit pattern to display on LED bar
+       self.lastByte = None        # last byte latched to the outputs
+       self.shiftsIssued = 0       # bytes actually shifted out
+       self.shiftsSuppressed = 0   # write() calls skipped as unchanged
 
     def __ping(self, p): #private method
+        # no sleep(0): one GPIO.output() call already outlasts the 74HC595's
+        # minimum pulse width, and yielding every pulse adds random latency
         GPIO.output(p,1)
-        time.sleep(0)
         GPIO.output(p,0)
 
     def shiftByte(self, b): # public method
@@ -29,6 +33,15 @@ class Shifter:
             GPIO.output(self.serialPin, b & (1<<i))
             self.__ping(self.clockPin) # add bit to register
         self.__ping(self.latchPin) # send register to output
+        self.lastByte = b
+        self.shiftsIssued += 1
+
+    def write(self, b): # only shift if the byte differs from what is latched
+        if b == self.lastByte:
+            self.shiftsSuppressed += 1
+            return False
+        self.shiftByte(b)
+        return True
 
 class Bug:
     range = [1, -1]
@@ -62,7 +75,7 @@ class Bug:
                 if walk > 0 and walk < 7:
                     self.x = walk
 
-            self.__shifter.shiftByte(1<<self.x)
+            self.__shifter.write(1<<self.x)
             time.sleep(self.timestep) #0.05 seconds
 
             '''
@@ -75,7 +88,7 @@ class Bug:
             
     def stop(self):
         self.starter = 0
-        self.__shifter.shiftByte(0)
+        self.__shifter.write(0) # called every loop while off, so skip repeats
         #GPIO.cleanup()
     
     def switch_on(self):
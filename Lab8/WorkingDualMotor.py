@@ -1,53 +1,109 @@
-import time
+import sys
 import multiprocessing
-import RPi.GPIO as GPIO
+from gpio_backends import default_backend, SimGPIO
 from shifter import Shifter 
+from output_daemon import OutputDaemon
+from coalescer import LatchCoalescer
+from step_timing import StepScheduler
+from planner import MotionPlanner
+import motion_profile
+import motor_table
+import drive_modes
 
 # --- STEPPER CLASS ---
 class Stepper:
     # Class attributes:
     num_steppers = 0      
-    shifter_outputs = multiprocessing.Value('I', 0)
-    seq = [0b0001,0b0011,0b0010,0b0110,0b0100,0b1100,0b1000,0b1001]
-    delay = 1200          
-    steps_per_degree = 4096/360    
-
-    def __init__(self, shifter, lock):
+    max_registers = 8
+    shifter_outputs = multiprocessing.Array('B', max_registers, lock=False)  # one byte per register
+    motors = motor_table.new_table(2*max_registers)   # position/target/state/steps per motor, in steps
+    outputs_lock = multiprocessing.Lock()   # guards shifter_outputs for motors given no lock
+    seq = list(drive_modes.HALF)   # default (half-step) sequence
+    delay = 1200          # per half step [us]; other modes scale it (drive_modes.step_delay)
+    steps_per_degree = drive_modes.steps_per_degree('half')
+    vmax = 120            # profiled moves: cruise speed [deg/s]
+    accel = 720           # profiled moves: acceleration [deg/s^2]
+
+    # profile='trapezoid'/'scurve' ramps moves up to vmax (which must be
+    # above the start speed), mode picks 'half'/'full'/'wave' stepping
+    # (see lab8p3.py)
+    def __init__(self, shifter, lock=None, daemon=None, profile=None, vmax=None, accel=None, mode='half'):
+        self.seq = drive_modes.sequence(mode)
+        self.steps_per_degree = drive_modes.steps_per_degree(mode)
+        self.delay = drive_modes.step_delay(Stepper.delay, mode)   # [us] per step of our mode
         self.s = shifter           
-        self.angle = multiprocessing.Value('d', 0.0)
-        self.step_state = 0        
+        self.daemon = daemon       # optional OutputDaemon (no lock needed)
+        self.slot = Stepper.num_steppers
         self.shifter_bit_start = 4 * Stepper.num_steppers
-        self.lock = lock           
+        self.lock = lock if lock is not None else Stepper.outputs_lock   # multiprocessing lock
+        self.scheduler = StepScheduler()   # step deadlines + timing stats of the last move
+        if profile is not None and profile not in motion_profile.PROFILES:
+            raise ValueError(f'unknown profile {profile!r} (expected one of {motion_profile.PROFILES})')
+        self.profile = profile
+        self.vmax = vmax if vmax is not None else Stepper.vmax
+        self.accel = accel if accel is not None else Stepper.accel
+        if self.vmax <= 0 or self.accel <= 0:
+            raise ValueError(f'vmax and accel must be positive, got {self.vmax} and {self.accel}')
+        v0 = 1e6/self.delay/self.steps_per_degree     # start speed [deg/s]
+        if profile is not None and self.vmax <= v0:
+            raise ValueError(f'vmax {self.vmax} deg/s is not above the {v0:.1f} deg/s start speed, '
+                             f'so the {profile} profile would never accelerate')
+        if self.shifter_bit_start >= 8*shifter.numRegisters:
+            raise ValueError('not enough shift registers in the chain for another motor')
+        self.row = Stepper.motors[self.slot]   # our record in the shared table
+        motor_table.reset(self.row)
         Stepper.num_steppers += 1   
 
+    # Angle from the exact step count (readable from any process, no lock):
+    @property
+    def angle(self):
+        return motor_table.angle(self.row.position, self.steps_per_degree)
+
+    @property
+    def step_state(self):
+        return self.row.state
+
+    @step_state.setter
+    def step_state(self, value):
+        self.row.state = value
+
     def __sgn(self, x):
         return 0 if x == 0 else int(abs(x)/x)
 
     def __step(self, dir):
         self.step_state += dir    
-        self.step_state %= 8      
-
-        mask = 0b1111 << self.shifter_bit_start
-        new_bits = Stepper.seq[self.step_state] << self.shifter_bit_start
+        self.step_state %= len(self.seq)
+        self.row.position += dir
+        self.row.steps += 1
+
+        if self.daemon is not None:   # daemon owns the Shifter; just publish
+            self.daemon.publish(self.slot, self.seq[self.step_state])
+            return
+
+        idx = self.shifter_bit_start // 8      # register byte holding our nibble
+        shift = self.shifter_bit_start % 8
+        mask = 0b1111 << shift
+        new_bits = self.seq[self.step_state] << shift
         
         # Critical Section: Update Shift Register
         with self.lock:
-            cur = Stepper.shifter_outputs.value
-            cur &= ~mask          
-            cur |= new_bits       
-            Stepper.shifter_outputs.value = cur
-            self.s.shiftByte(cur) 
-            
-            # Update angle safely
-            self.angle.value = (self.angle.value + dir/Stepper.steps_per_degree) % 360
+            outputs = Stepper.shifter_outputs
+            outputs[idx] = (outputs[idx] & ~mask) | new_bits
+            self.s.shiftBytes(memoryview(outputs)[:self.s.numRegisters])
 
     # INTERNAL rotate function (Do the work)
     def _do_rotation(self, delta):
-        numSteps = int(Stepper.steps_per_degree * abs(delta))
+        numSteps = int(self.steps_per_degree * abs(delta))
         dir = self.__sgn(delta)
-        for s in range(numSteps):
-            self.__step(dir)
-            time.sleep(Stepper.delay/1e6)
+        self.row.target = self.row.position + dir*numSteps
+        # Absolute deadlines, so shift/lock time doesn't stretch the move
+        if self.profile is None:
+            intervals = self.delay
+        else:
+            spd = self.steps_per_degree
+            intervals = motion_profile.intervals(self.profile, numSteps, self.vmax*spd,
+                                                 self.accel*spd, 1e6/self.delay)
+        self.scheduler.run(numSteps, intervals, lambda: self.__step(dir))
 
     # PUBLIC rotate: NOW BLOCKING (Run in current process)
     def rotate(self, delta):
@@ -57,12 +113,17 @@ class Stepper:
 
     def goAngle(self, target_angle):
         # Calculate shortest path
-        current = self.angle.value
+        current = self.angle
         delta = ((target_angle - current + 180) % 360) - 180 
         self.rotate(delta)
 
     def zero(self):
-        self.angle.value = 0.0
+        self.row.position = 0
+        self.row.target = 0
+
+    # Step timing (jitter/overrun histograms, drift) of the last move:
+    def moveStats(self):
+        return self.scheduler.stats()
 
 # --- SEQUENCE DEFINITIONS ---
 # We define functions that run the specific list of moves for each motor
@@ -82,17 +143,51 @@ def run_m2_sequence(motor):
 # --- MAIN ---
 if __name__ == '__main__':
     try:
+        # Run with --sim to use the in-memory GPIO backend (no Pi needed):
+        GPIO = SimGPIO() if '--sim' in sys.argv else default_backend()
         GPIO.setmode(GPIO.BCM)
-        s = Shifter(data=16, latch=20, clock=21)
+        s = Shifter(data=16, latch=20, clock=21, gpio=GPIO)
         lock = multiprocessing.Lock()
 
+        # Run with --daemon to have one process own the Shifter and the
+        # motors publish their steps to it, instead of sharing the lock:
+        daemon = None
+        if '--daemon' in sys.argv:
+            daemon = OutputDaemon(s, rate_hz=2000)
+            daemon.start()
+            lock = None
+
+        # Run with --coalesce to merge both motors' steps into at most one
+        # shift per 100 us tick:
+        coalescer = None
+        if '--coalesce' in sys.argv:
+            coalescer = LatchCoalescer(s, tick_us=100)
+            coalescer.start()
+
         # Instantiate Steppers
-        m1 = Stepper(s, lock)
-        m2 = Stepper(s, lock)
+        # Run with --profile trapezoid (or scurve) for accelerated moves:
+        profile = sys.argv[sys.argv.index('--profile') + 1] if '--profile' in sys.argv else None
+        # ...and --mode full (or wave) for 2048-step/rev drive modes:
+        mode = sys.argv[sys.argv.index('--mode') + 1] if '--mode' in sys.argv else 'half'
+        m1 = Stepper(coalescer or s, lock, daemon, profile, mode=mode)
+        m2 = Stepper(coalescer or s, lock, daemon, profile, mode=mode)
 
         m1.zero()
         m2.zero()
 
+        # Run with --plan to drive both motors from this process with one
+        # combined shift per step, so paired moves start and end together:
+        if '--plan' in sys.argv:
+            planner = MotionPlanner(s, [m1, m2], profile)
+            print("Starting Coordinated Movement...")
+            planner.moveTo([90, -90])
+            planner.moveTo([-45, 45])
+            for a in (-135, 135, 0):
+                planner.moveTo([a, None])
+            print("All moves complete.")
+            print(planner.stats())
+            sys.exit()
+
         print("Starting Simultaneous Movement...")
 
         # Create TWO processes:
@@ -109,6 +204,14 @@ if __name__ == '__main__':
         p2.join()
 
         print("All sequences complete.")
+        print(m1.moveStats())
+        print(m2.moveStats())
+        if daemon is not None:
+            daemon.stop()
+            print(daemon.stats())
+        if coalescer is not None:
+            coalescer.stop()
+            print(coalescer.stats())
 
     except KeyboardInterrupt:
         print('\nStopping motors...')
@@ -0,0 +1,150 @@
+# asyncio Shifter and Stepper
+#
+# Stepper runs every move in its own process and times steps with
+# time.sleep(). Here the same motors are driven from one asyncio event
+# loop instead: each step is a callback scheduled with loop.call_at() on
+# an absolute deadline, so any number of concurrent moves (and socket
+# servers, input handling, ...) can share one cheap process on the Pi
+# Zero without a multiprocessing.Process per rotate().
+
+import sys
+import asyncio
+from lab8p3 import Stepper   # for the step sequence and timing constants
+
+class AsyncShifter:
+    """
+    Wraps a Shifter for use from the event loop. Motors update their
+    nibble of the shared frame with setNibble(); all updates made in the
+    same loop iteration (e.g. two motors stepping on the same deadline)
+    go out as one shift.
+    """
+
+    def __init__(self, shifter):
+        self.s = shifter
+        self.numRegisters = shifter.numRegisters
+        self.frame = bytearray(shifter.numRegisters)   # combined outputs for all motors
+        self.flushPending = False
+
+    # Shift a word (int or whole-chain bytes frame) right away, skipping
+    # it if it is already latched:
+    async def write(self, word, num_bits=8):
+        return self.s.write(word, num_bits)
+
+    # Set the 4 outputs of motor pos and schedule one flush for this
+    # loop iteration:
+    def setNibble(self, pos, nibble):
+        i, shift = divmod(4*pos, 8)
+        self.frame[i] = (self.frame[i] & ~(0b1111 << shift)) | (nibble << shift)
+        if not self.flushPending:
+            self.flushPending = True
+            asyncio.get_running_loop().call_soon(self.__flush)
+
+    def __flush(self):
+        self.flushPending = False
+        self.s.write(self.frame)
+
+
+class AsyncStepper:
+    """
+    Stepper on an AsyncShifter. rotate() and goAngle() are coroutines;
+    moves on the same motor run in the order they were called, moves on
+    different motors run concurrently.
+    """
+
+    num_steppers = 0
+    seq = Stepper.seq
+    delay = Stepper.delay                  # delay between motor steps [us]
+    steps_per_degree = Stepper.steps_per_degree
+
+    def __init__(self, ashifter, delay=None):
+        self.s = ashifter
+        self.delay = delay if delay is not None else AsyncStepper.delay
+        self.angle = 0.0           # current output shaft angle
+        self.step_state = 0        # track position in sequence
+        self.pos = AsyncStepper.num_steppers   # our nibble in the frame
+        if 4*self.pos >= 8*ashifter.numRegisters:
+            raise ValueError('not enough shift registers in the chain for another motor')
+        self.moveLock = None       # created on first use, inside the running loop
+        AsyncStepper.num_steppers += 1
+
+    def __sgn(self, x):
+        return 0 if x == 0 else int(abs(x)/x)
+
+    def __step(self, dir):
+        self.step_state = (self.step_state + dir) % 8
+        self.s.setNibble(self.pos, AsyncStepper.seq[self.step_state])
+        self.angle = (self.angle + dir/AsyncStepper.steps_per_degree) % 360
+
+    def __lock(self):
+        if self.moveLock is None:
+            self.moveLock = asyncio.Lock()
+        return self.moveLock
+
+    # Take the steps for one move, each on its own loop.call_at() deadline
+    # (start + k*delay, so callback latency doesn't add up over the move):
+    async def __rotate(self, delta):
+        numSteps = int(AsyncStepper.steps_per_degree * abs(delta))
+        dir = self.__sgn(delta)
+        if numSteps == 0:
+            return
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        period = self.delay/1e6
+        start = loop.time()
+        state = {'taken': 0}
+
+        def tick():
+            if done.cancelled():          # move was cancelled: stop stepping
+                return
+            self.__step(dir)
+            state['taken'] += 1
+            if state['taken'] == numSteps:
+                done.set_result(None)
+            else:
+                loop.call_at(start + state['taken']*period, tick)
+
+        loop.call_at(start, tick)
+        await done
+
+    # Move relative angle from current position:
+    async def rotate(self, delta):
+        async with self.__lock():
+            await self.__rotate(delta)
+
+    # Move to an absolute angle taking the shortest possible path. The
+    # delta is worked out once earlier moves on this motor have finished.
+    async def goAngle(self, angle):
+        async with self.__lock():
+            delta = ((angle - self.angle + 180) % 360) - 180
+            await self.__rotate(delta)
+
+    # Set the motor zero point
+    def zero(self):
+        self.angle = 0.0
+
+
+# Example use (add --sim to run off the Pi):
+if __name__ == '__main__':
+    from gpio_backends import default_backend, SimGPIO
+    from shifter import Shifter
+
+    async def main(s):
+        a = AsyncShifter(s)
+        m1 = AsyncStepper(a)
+        m2 = AsyncStepper(a)
+        # Both motors move at the same time, each running its moves in order:
+        await asyncio.gather(
+            m1.goAngle(90), m1.goAngle(-45),
+            m2.goAngle(-90), m2.goAngle(45),
+        )
+        print(f'm1 at {m1.angle:.1f}, m2 at {m2.angle:.1f}')
+        await a.write(0)
+
+    GPIO = SimGPIO() if '--sim' in sys.argv else default_backend()
+    try:
+        GPIO.setmode(GPIO.BCM)
+        asyncio.run(main(Shifter(data=16, latch=20, clock=21, gpio=GPIO)))
+    except KeyboardInterrupt:
+        print('\nStopping...')
+    finally:
+        GPIO.cleanup()
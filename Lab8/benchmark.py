@@ -0,0 +1,199 @@
+# Shifter and Stepper benchmark suite
+#
+# Shifter: bits/s and frames/s for shiftByte() and shiftWord() called in a
+# loop vs. one shiftFrames() call, with and without the precompiled op
+# tables (compiled=True), plus whole-chain shiftBytes() frames.
+#
+# Stepper: for 1 to 8 motors moving at once with goAngle() (each motor
+# runs its moves in its own worker process, as usual), the achieved step
+# rate vs. the nominal Stepper.delay, inter-step interval and jitter
+# percentiles, the time spent waiting for the shared lock, and the
+# dispatch-to-first-step latency.
+#
+# Run on the Pi with the shift register wired as in lab8p3.py:
+#   python3 benchmark.py [num_frames] [--json out.json]
+# or anywhere else against the simulated GPIO backend:
+#   python3 benchmark.py [num_frames] --sim [--json out.json]
+#
+# Results are printed as JSON (or written to the --json file) so runs
+# can be compared before deploying.
+
+import sys
+import json
+import time
+import platform
+import multiprocessing
+from gpio_backends import default_backend, SimGPIO
+from shifter import Shifter
+from lab8p3 import Stepper
+
+# Push every frame with one shiftByte() call each:
+def bench_shiftByte(s, frames):
+    t0 = time.perf_counter()
+    for f in frames:
+        s.shiftByte(f)
+    return len(frames)/(time.perf_counter() - t0)
+
+# Push every frame with one shiftWord() call each:
+def bench_shiftWord(s, frames, num_bits):
+    t0 = time.perf_counter()
+    for f in frames:
+        s.shiftWord(f, num_bits)
+    return len(frames)/(time.perf_counter() - t0)
+
+# Push every whole-chain frame with one shiftBytes() call each:
+def bench_shiftBytes(s, frames):
+    t0 = time.perf_counter()
+    for f in frames:
+        s.shiftBytes(f)
+    return len(frames)/(time.perf_counter() - t0)
+
+# Push all frames with a single shiftFrames() call:
+def bench_shiftFrames(s, frames, num_bits=None):
+    t0 = time.perf_counter()
+    s.shiftFrames(frames, num_bits=num_bits)
+    return len(frames)/(time.perf_counter() - t0)
+
+# frames/s and bits/s for one result:
+def rate(fps, bits):
+    return {'frames_per_s': round(fps, 1), 'bits_per_s': round(fps*bits, 1)}
+
+def bench_shifter(gpio, n):
+    bytes_ = [i % 256 for i in range(n)]
+    words = [(i*2654435761) & 0xFFFFFFFF for i in range(n)]
+    chain = [w.to_bytes(4, 'little') for w in words]
+    results = {}
+    for compiled in (False, True):
+        tag = ' (compiled)' if compiled else ''
+        s = Shifter(data=16, latch=20, clock=21, compiled=compiled, gpio=gpio)
+        s4 = Shifter(data=16, latch=20, clock=21, compiled=compiled, registers=4, gpio=gpio)
+        results['shiftByte loop' + tag] = rate(bench_shiftByte(s, bytes_), 8)
+        results['shiftWord(32) loop' + tag] = rate(bench_shiftWord(s, words, 32), 32)
+        results['shiftBytes(4 registers) loop' + tag] = rate(bench_shiftBytes(s4, chain), 32)
+        results['shiftFrames(8)' + tag] = rate(bench_shiftFrames(s, bytes_, 8), 8)
+        results['shiftFrames(32)' + tag] = rate(bench_shiftFrames(s, words, 32), 32)
+    return results
+
+
+# Shifter stand-in for one motor that timestamps every frame the motor
+# pushes (i.e. every step) into shared memory, so the timings survive the
+# motor's worker process.
+class StepTimer:
+    def __init__(self, shifter, max_steps):
+        self.s = shifter
+        self.numRegisters = shifter.numRegisters
+        self.times = multiprocessing.Array('q', max_steps, lock=False)
+        self.count = multiprocessing.Value('i', 0, lock=False)
+
+    def shiftBytes(self, frame):
+        i = self.count.value
+        if i < len(self.times):
+            self.times[i] = time.perf_counter_ns()
+            self.count.value = i + 1
+        self.s.shiftBytes(frame)
+
+# Lock wrapper that adds up how long every acquire waited (shared across
+# the motor processes):
+class TimedLock:
+    def __init__(self):
+        self.lock = multiprocessing.Lock()
+        self.waits = multiprocessing.Array('d', 3, lock=False)   # total ns, max ns, acquires
+
+    def __enter__(self):
+        t0 = time.perf_counter_ns()
+        self.lock.acquire()
+        wait = time.perf_counter_ns() - t0
+        w = self.waits                # only updated while holding the lock
+        w[0] += wait
+        w[1] = max(w[1], wait)
+        w[2] += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+def percentiles(values, ps=(50, 90, 99)):
+    if not values:
+        return {}
+    v = sorted(values)
+    out = {f'p{p}': round(v[min(len(v) - 1, int(len(v)*p/100))], 1) for p in ps}
+    out['max'] = round(v[-1], 1)
+    return out
+
+# Move num_motors motors by angle at the same time and collect step timing:
+def bench_steppers(gpio, num_motors, angle):
+    Stepper.num_steppers = 0
+    for i in range(len(Stepper.shifter_outputs)):
+        Stepper.shifter_outputs[i] = 0
+    s = Shifter(data=16, latch=20, clock=21, registers=(num_motors + 1)//2, gpio=gpio)
+    lock = TimedLock()
+    steps = int(Stepper.steps_per_degree * abs(angle))
+    timers = [StepTimer(s, steps) for i in range(num_motors)]
+    motors = [Stepper(t, lock) for t in timers]
+    for m in motors:
+        m.zero()
+    for m in motors:
+        m.goAngle(angle)             # queued for the motor's worker; returns right away
+    for m in motors:
+        m.stop()                     # finish the move and end the worker
+
+    intervals = []   # [us]
+    rates = []       # achieved steps/s per motor
+    for t in timers:
+        ts = t.times[:t.count.value]
+        d = [(b - a)/1e3 for a, b in zip(ts, ts[1:])]
+        intervals += d
+        if d:
+            rates.append(1e6*len(d)/sum(d))
+    nominal = 1e6/Stepper.delay
+    waits = lock.waits
+    return {
+        'steps_per_motor': steps,
+        'completed_steps': [t.count.value for t in timers],
+        'nominal_step_rate': round(nominal, 1),
+        'achieved_step_rate': round(sum(rates)/len(rates), 1) if rates else 0.0,
+        'achieved_vs_nominal': round(sum(rates)/len(rates)/nominal, 3) if rates else 0.0,
+        'interval_us': percentiles(intervals),
+        'jitter_us': percentiles([abs(d - Stepper.delay) for d in intervals]),
+        'latency_ms': [m.latency()['last_ms'] for m in motors],
+        'lock_wait_us': {
+            'total': round(waits[0]/1e3, 1),
+            'avg': round(waits[0]/waits[2]/1e3, 2) if waits[2] else 0.0,
+            'max': round(waits[1]/1e3, 1),
+        },
+    }
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    out_path = None
+    if '--json' in args:
+        i = args.index('--json')
+        out_path = args[i+1]
+        del args[i:i+2]
+    sim = '--sim' in args
+    args = [a for a in args if a != '--sim']
+    n = int(args[0]) if args else 10000
+    GPIO = SimGPIO() if sim else default_backend()
+    try:
+        GPIO.setmode(GPIO.BCM)
+        results = {
+            'backend': 'sim' if sim else 'RPi.GPIO',
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'num_frames': n,
+            'shifter': bench_shifter(GPIO, n),
+            'stepper': {'delay_us': Stepper.delay, 'angle': 45, 'motors': {}},
+        }
+        for k in range(1, 9):
+            results['stepper']['motors'][str(k)] = bench_steppers(GPIO, k, 45)
+        Shifter(data=16, latch=20, clock=21, registers=4, gpio=GPIO).shiftBytes(bytes(4))
+        if out_path:
+            with open(out_path, 'w') as f:
+                json.dump(results, f, indent=2)
+        else:
+            print(json.dumps(results, indent=2))
+    except KeyboardInterrupt:
+        print('\nStopping...')
+    finally:
+        GPIO.cleanup()
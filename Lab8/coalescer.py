@@ -0,0 +1,141 @@
+# Tick-based latch coalescer
+#
+# When several motors (or LED bars) share one register chain, each of
+# their updates normally costs a full shift of the chain, so two motors
+# stepping at nearly the same instant shift twice back to back. The
+# LatchCoalescer sits in front of the Shifter instead: producers in any
+# process update a shared frame, and a tick loop shifts the merged frame
+# out at most once per tick (e.g. every 100 us). The bus load per tick is
+# then one frame no matter how many producers share the chain.
+
+import time
+import multiprocessing
+
+# Indices into the shared counters:
+UPDATES, SHIFTS, TICKS = range(3)
+
+class LatchCoalescer:
+    """
+    Has the same shiftByte()/shiftWord()/shiftBytes() calls as Shifter, so
+    it can be handed to Stepper in place of the Shifter; each call just
+    updates the pending frame. setBits()/setNibble() update part of the
+    frame for producers that only own a few outputs.
+
+    mergeRatio() is updates received per shift actually sent (1.0 means no
+    merging happened; 2.0 means every shift carried two updates, ...).
+    """
+
+    def __init__(self, shifter, tick_us=100):
+        self.s = shifter
+        self.numRegisters = shifter.numRegisters
+        self.tick = int(tick_us*1000)     # [ns]
+        self.frame = multiprocessing.Array('B', self.numRegisters, lock=False)
+        self.dirty = multiprocessing.Value('b', 0, lock=False)
+        self.counts = multiprocessing.Array('q', 3, lock=False)
+        self.lock = multiprocessing.Lock()   # guards frame, dirty and counts (never held while shifting)
+        self.running = multiprocessing.Value('b', 0, lock=False)
+        self.p = None
+
+    # Set width bits starting at bit_start (same bit numbering as an
+    # integer word passed to Shifter.shiftWord) to value:
+    def setBits(self, bit_start, width, value):
+        with self.lock:
+            frame = self.frame
+            for i in range(width):
+                bit = bit_start + i
+                if value & (1<<i):
+                    frame[bit // 8] |= 1 << (bit % 8)
+                else:
+                    frame[bit // 8] &= ~(1 << (bit % 8))
+            self.dirty.value = 1
+            self.counts[UPDATES] += 1
+
+    # Set the 4 outputs of motor/nibble pos (bits 4*pos..4*pos+3):
+    def setNibble(self, pos, nibble):
+        self.setBits(4*pos, 4, nibble)
+
+    # Replace the whole pending frame (one byte per register):
+    def shiftBytes(self, frame):
+        frame = bytes(frame)
+        if len(frame) != self.numRegisters:
+            raise ValueError(f'frame must be {self.numRegisters} bytes, got {len(frame)}')
+        with self.lock:
+            self.frame[:] = frame
+            self.dirty.value = 1
+            self.counts[UPDATES] += 1
+
+    # A word as wide as the chain replaces the pending frame; a narrower
+    # one only replaces its low num_bits, the rest of the frame keeps its
+    # pending outputs:
+    def shiftWord(self, dataword, num_bits):
+        width = 8*self.numRegisters
+        if not 0 < num_bits <= width:
+            raise ValueError(f'num_bits must be 1..{width} for a {self.numRegisters}-register chain, got {num_bits}')
+        if num_bits < width:
+            self.setBits(0, num_bits, dataword)
+            return
+        self.shiftBytes((dataword & ((1<<num_bits) - 1)).to_bytes(self.numRegisters, 'little'))
+
+    def shiftByte(self, databyte):
+        self.shiftWord(databyte, 8)
+
+    # Shift the pending frame out if anything changed since the last tick.
+    # Called by the tick loop, or directly to push an update immediately.
+    def flush(self):
+        with self.lock:
+            if not self.dirty.value:
+                return False
+            frame = bytes(self.frame)
+            self.dirty.value = 0
+            self.counts[SHIFTS] += 1
+        self.s.shiftBytes(frame)
+        return True
+
+    def start(self):
+        self.running.value = 1
+        self.p = multiprocessing.Process(target=self.__run, daemon=True)
+        self.p.start()
+
+    def stop(self):
+        self.running.value = 0
+        if self.p is not None:
+            self.p.join()
+            self.p = None
+        self.flush()                      # don't lose the last update
+
+    # Tick loop: flush once per tick on absolute deadlines.
+    def __run(self):
+        deadline = time.monotonic_ns()
+        while self.running.value:
+            self.flush()
+            self.counts[TICKS] += 1
+            deadline += self.tick
+            wait = deadline - time.monotonic_ns()
+            if wait > 0:
+                time.sleep(wait/1e9)
+            else:
+                deadline = time.monotonic_ns()   # fell behind: skip missed ticks
+
+    def mergeRatio(self):
+        shifts = self.counts[SHIFTS]
+        return self.counts[UPDATES]/shifts if shifts else 0.0
+
+    def stats(self):
+        return {
+            'updates': self.counts[UPDATES],
+            'shifts': self.counts[SHIFTS],
+            'ticks': self.counts[TICKS],
+            'merge_ratio': self.mergeRatio(),
+        }
+
+
+# Example:
+#
+# s = Shifter(data=16, latch=20, clock=21)
+# c = LatchCoalescer(s, tick_us=100)
+# c.start()
+# m1 = Stepper(c, lock)       # steps update the pending frame...
+# m2 = Stepper(c, lock)       # ...and at most one shift goes out per tick
+# ...
+# c.stop()
+# print(c.stats())
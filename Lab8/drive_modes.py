@@ -0,0 +1,45 @@
+# Stepper drive modes
+#
+# Coil sequences for the 28BYJ-48 (bit k = driver input k+1):
+#
+#   wave  - one coil at a time: 4 steps per cycle, least current and
+#           torque
+#   full  - two adjacent coils at a time (two-phase on): 4 steps per
+#           cycle, the most torque, and half the steps (so half the
+#           shifts/GPIO writes) per revolution of half-stepping
+#   half  - alternating one and two coils: 8 steps per cycle, twice the
+#           resolution
+#
+# The motor takes 512 sequence cycles per output shaft revolution (8 per
+# turn of the rotor, through the ~1:64 gearbox), so wave and full
+# stepping have 2048 steps/rev and half stepping 4096.
+
+CYCLES_PER_REV = 512
+
+WAVE = (0b0001, 0b0010, 0b0100, 0b1000)
+FULL = (0b0011, 0b0110, 0b1100, 0b1001)
+HALF = (0b0001, 0b0011, 0b0010, 0b0110, 0b0100, 0b1100, 0b1000, 0b1001)
+
+MODES = {
+    'wave': WAVE,
+    'full': FULL,
+    'half': HALF,
+}
+
+# Coil sequence for a mode:
+def sequence(mode):
+    try:
+        return MODES[mode]
+    except KeyError:
+        raise ValueError(f'unknown drive mode {mode!r} (expected one of {tuple(MODES)})') from None
+
+def steps_per_rev(mode):
+    return CYCLES_PER_REV*len(sequence(mode))
+
+def steps_per_degree(mode):
+    return steps_per_rev(mode)/360
+
+# Delay per step of mode [us] that turns the shaft at the same speed as
+# half_step_delay per half step (a wave or full step is two half steps):
+def step_delay(half_step_delay, mode):
+    return half_step_delay*steps_per_rev('half')/steps_per_rev(mode)
@@ -0,0 +1,644 @@
+# GPIO backends
+#
+# Shifter (and everything built on it) talks to the pins through a
+# "backend" object instead of importing RPi.GPIO directly. A backend is
+# anything with the same calls as the RPi.GPIO module:
+#
+#   setmode(mode), setup(pin, mode, ...), output(pin, value),
+#   input(pin), PWM(pin, freq), cleanup()
+#
+# plus the usual constants (BCM, OUT, IN, HIGH, LOW, ...). The RPi.GPIO
+# module itself is therefore a backend, and is the default on the Pi.
+# SimGPIO below is an in-memory stand-in that records every edge with a
+# timestamp, so the same classes can be profiled on any computer.
+# MmapGPIO drives the GPIO registers directly through /dev/gpiomem, and
+# GpiodGPIO uses the kernel GPIO character device through libgpiod.
+
+import os
+import stat
+import mmap
+import threading
+from enum import Enum
+from array import array
+from types import SimpleNamespace
+from datetime import timedelta
+from time import perf_counter_ns, monotonic_ns, sleep
+
+# Return the real RPi.GPIO module. Imported here rather than at the top of
+# each file so modules can be loaded off the Pi when a backend is injected.
+def default_backend():
+    from RPi import GPIO
+    return GPIO
+
+
+class SimPWM:
+    # Mirrors RPi.GPIO.PWM; just remembers its settings.
+    def __init__(self, gpio, pin, freq):
+        self.gpio = gpio
+        self.pin = pin
+        self.freq = freq
+        self.dutyCycle = 0
+        self.running = False
+
+    def start(self, dc):
+        self.dutyCycle = dc
+        self.running = True
+
+    def ChangeDutyCycle(self, dc):
+        self.dutyCycle = dc
+
+    def ChangeFrequency(self, freq):
+        self.freq = freq
+
+    def stop(self):
+        self.running = False
+
+
+class SimGPIO:
+    """
+    In-memory GPIO backend with the RPi.GPIO calls.
+
+    Every level change on any pin is recorded as (timestamp_ns, pin, value)
+    into a ring buffer preallocated as three arrays of `capacity` entries,
+    so recording costs no allocation. Once full, the oldest edges are
+    overwritten; `count` keeps the total number of edges ever recorded and
+    `writes` the number of output() calls (including ones that did not
+    change the level).
+    """
+
+    # Same values as RPi.GPIO:
+    BOARD, BCM = 10, 11
+    OUT, IN = 0, 1
+    LOW, HIGH = 0, 1
+    PUD_OFF, PUD_DOWN, PUD_UP = 20, 21, 22
+    RISING, FALLING, BOTH = 31, 32, 33
+
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self.times = array('q', bytes(8*capacity))   # perf_counter_ns() of each edge
+        self.pins = array('H', bytes(2*capacity))    # pin number of each edge
+        self.values = array('B', bytes(capacity))    # new level of each edge
+        self.count = 0            # total edges recorded (may exceed capacity)
+        self.writes = 0           # total output() calls
+        self.mode = None
+        self.modes = {}           # pin -> OUT/IN
+        self.levels = {}          # pin -> current level
+        self.callbacks = {}       # pin -> (edge, callback)
+
+    # Record one level change in the ring buffer:
+    def __record(self, pin, value):
+        i = self.count % self.capacity
+        self.times[i] = perf_counter_ns()
+        self.pins[i] = pin
+        self.values[i] = value
+        self.count += 1
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, mode, pull_up_down=None, initial=None):
+        for p in (pin if isinstance(pin, (list, tuple)) else (pin,)):
+            self.modes[p] = mode
+            if initial is not None:
+                self.output(p, initial)
+            elif mode == self.IN:
+                self.levels.setdefault(p, 1 if pull_up_down == self.PUD_UP else 0)
+
+    def output(self, pin, value):
+        if isinstance(pin, (list, tuple)):       # RPi.GPIO allows lists of pins
+            if not isinstance(value, (list, tuple)):
+                value = [value]*len(pin)
+            for p, v in zip(pin, value):
+                self.output(p, v)
+            return
+        self.writes += 1
+        value = 1 if value else 0                # any truthy value is HIGH
+        if self.levels.get(pin) != value:
+            self.levels[pin] = value
+            self.__record(pin, value)
+
+    def input(self, pin):
+        return self.levels.get(pin, 0)
+
+    # Simulate an external signal on an input pin (e.g. a switch), firing
+    # any callback registered with add_event_detect():
+    def drive(self, pin, value):
+        value = 1 if value else 0
+        old = self.levels.get(pin, 0)
+        self.levels[pin] = value
+        if old == value:
+            return
+        self.__record(pin, value)
+        if pin in self.callbacks:
+            edge, callback = self.callbacks[pin]
+            if edge == self.BOTH or edge == (self.RISING if value else self.FALLING):
+                callback(pin)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.callbacks[pin] = (edge, callback or (lambda channel: None))
+
+    def remove_event_detect(self, pin):
+        self.callbacks.pop(pin, None)
+
+    def PWM(self, pin, freq):
+        return SimPWM(self, pin, freq)
+
+    def cleanup(self, pin=None):
+        if pin is None:
+            self.modes.clear()
+            self.callbacks.clear()
+        else:
+            self.modes.pop(pin, None)
+            self.callbacks.pop(pin, None)
+
+    # Recorded edges still in the buffer, oldest first, as a list of
+    # (timestamp_ns, pin, value):
+    def edges(self):
+        n = min(self.count, self.capacity)
+        start = self.count - n
+        out = []
+        for k in range(start, self.count):
+            i = k % self.capacity
+            out.append((self.times[i], self.pins[i], self.values[i]))
+        return out
+
+    # Timestamps of the rising edges on one pin (e.g. every latch pulse),
+    # handy for working out per-frame or per-step timing:
+    def risingEdges(self, pin):
+        return [t for t, p, v in self.edges() if p == pin and v]
+
+    def clear(self):
+        self.count = 0
+        self.writes = 0
+
+
+class MmapGPIO:
+    """
+    Register-level backend: mmaps the BCM283x GPIO block (/dev/gpiomem)
+    and drives it with plain 32-bit loads and stores, so an output is one
+    store to GPSET/GPCLR instead of a library call, and several pins can
+    change together with one store (output() with a list of pins, or
+    setClear()). readAll()/readPins() read every pin level in a bank with
+    a single load of GPLEV.
+
+    path may be a regular file standing in for /dev/gpiomem (it is created
+    or grown to one page if needed; paths under /dev are never created, so
+    a missing device still fails). Since a file has no hardware behind it, writes
+    to GPSET/GPCLR then also update GPLEV so reads see the outputs.
+
+    Only BCM numbering is supported. Pull-ups/downs use the BCM2835/2837
+    GPPUD sequence (Pi Zero/1/2/3); PWM is not available at this level.
+    """
+
+    BOARD, BCM = 10, 11
+    OUT, IN = 0, 1
+    LOW, HIGH = 0, 1
+    PUD_OFF, PUD_DOWN, PUD_UP = 20, 21, 22
+    RISING, FALLING, BOTH = 31, 32, 33
+
+    # Register offsets, in 32-bit words:
+    GPFSEL = 0x00//4     # function select, 10 pins per register
+    GPSET = 0x1C//4      # write 1s to set outputs high (2 banks of 32 pins)
+    GPCLR = 0x28//4      # write 1s to set outputs low
+    GPLEV = 0x34//4      # pin levels
+    GPPUD = 0x94//4
+    GPPUDCLK = 0x98//4
+
+    def __init__(self, path='/dev/gpiomem'):
+        flags = os.O_RDWR | os.O_SYNC
+        if not os.path.abspath(path).startswith('/dev/'):
+            flags |= os.O_CREAT          # stand-in file
+        fd = os.open(path, flags, 0o644)
+        try:
+            self.emulate = not stat.S_ISCHR(os.fstat(fd).st_mode)
+            if self.emulate and os.fstat(fd).st_size < mmap.PAGESIZE:
+                os.ftruncate(fd, mmap.PAGESIZE)
+            self.mem = mmap.mmap(fd, mmap.PAGESIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+        self.regs = memoryview(self.mem).cast('I')   # one element = one 32-bit register
+        self.mode = None
+        self.pinsUsed = set()
+
+    def setmode(self, mode):
+        if mode != self.BCM:
+            raise ValueError('MmapGPIO only supports BCM pin numbering')
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    # Set a pin's function to input (000) or output (001):
+    def __function(self, pin, mode):
+        reg = self.GPFSEL + pin//10
+        shift = (pin % 10)*3
+        self.regs[reg] = (self.regs[reg] & ~(0b111 << shift)) | ((1 if mode == self.OUT else 0) << shift)
+
+    def __pull(self, pin, pud):
+        code = {self.PUD_OFF: 0, self.PUD_DOWN: 1, self.PUD_UP: 2}[pud]
+        self.regs[self.GPPUD] = code
+        sleep_cycles()
+        self.regs[self.GPPUDCLK + (pin >> 5)] = 1 << (pin & 31)
+        sleep_cycles()
+        self.regs[self.GPPUD] = 0
+        self.regs[self.GPPUDCLK + (pin >> 5)] = 0
+
+    def setup(self, pin, mode, pull_up_down=None, initial=None):
+        for p in (pin if isinstance(pin, (list, tuple)) else (pin,)):
+            if initial is not None:
+                self.output(p, initial)       # set the level before driving it
+            self.__function(p, mode)
+            if pull_up_down is not None:
+                self.__pull(p, pull_up_down)
+            self.pinsUsed.add(p)
+
+    # One store to GPSET and/or GPCLR for bank (0: GPIO 0-31, 1: 32-53):
+    def setClear(self, set_mask, clear_mask, bank=0):
+        regs = self.regs
+        if set_mask:
+            regs[self.GPSET + bank] = set_mask
+        if clear_mask:
+            regs[self.GPCLR + bank] = clear_mask
+        if self.emulate:
+            regs[self.GPLEV + bank] = (regs[self.GPLEV + bank] | set_mask) & ~clear_mask
+
+    def output(self, pin, value):
+        if isinstance(pin, (list, tuple)):    # bulk: one set and one clear store per bank
+            if not isinstance(value, (list, tuple)):
+                value = [value]*len(pin)
+            masks = [[0, 0], [0, 0]]
+            for p, v in zip(pin, value):
+                masks[p >> 5][0 if v else 1] |= 1 << (p & 31)
+            for bank in (0, 1):
+                if masks[bank][0] or masks[bank][1]:
+                    self.setClear(masks[bank][0], masks[bank][1], bank)
+            return
+        bit = 1 << (pin & 31)
+        self.regs[(self.GPSET if value else self.GPCLR) + (pin >> 5)] = bit
+        if self.emulate:
+            lev = self.GPLEV + (pin >> 5)
+            self.regs[lev] = (self.regs[lev] | bit) if value else (self.regs[lev] & ~bit)
+
+    def input(self, pin):
+        return (self.regs[self.GPLEV + (pin >> 5)] >> (pin & 31)) & 1
+
+    # All 32 pin levels of a bank in one load:
+    def readAll(self, bank=0):
+        return self.regs[self.GPLEV + bank]
+
+    # Levels of several pins, loading each bank's level register once:
+    def readPins(self, pins):
+        lev = [self.regs[self.GPLEV], self.regs[self.GPLEV + 1]]
+        return [(lev[p >> 5] >> (p & 31)) & 1 for p in pins]
+
+    def PWM(self, pin, freq):
+        raise NotImplementedError('MmapGPIO has no PWM; use RPi.GPIO for PWM pins')
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        raise NotImplementedError('MmapGPIO has no edge detection; poll readAll() instead')
+
+    # Return the pins we used to inputs:
+    def cleanup(self, pin=None):
+        for p in ([pin] if pin is not None else list(self.pinsUsed)):
+            self.__function(p, self.IN)
+            self.pinsUsed.discard(p)
+
+    def close(self):
+        self.regs.release()
+        self.mem.close()
+
+# The GPPUD sequence needs ~150 core cycles between steps; a couple of
+# microseconds of spinning covers that on any Pi.
+def sleep_cycles():
+    t = perf_counter_ns() + 2000
+    while perf_counter_ns() < t:
+        pass
+
+
+class GpiodGPIO:
+    """
+    Backend on the GPIO character device (/dev/gpiochipN) via the libgpiod
+    v2 Python bindings, for kernels where RPi.GPIO no longer works.
+
+    setup() with a list of pins requests them as one line group, and
+    output() with a list of pins in the same group updates them with a
+    single set_values() call, so e.g. a stepper's four coil pins change
+    together. Edge events are read in batches with their kernel
+    timestamps by readEvents(); add_event_detect() callbacks are fed from
+    a background thread, as with RPi.GPIO.
+
+    chip is a path (opened with the gpiod module) or a chip object with
+    the same request_lines() call plus the gpiod names we use
+    (LineSettings, Direction, Value, Edge, Bias), e.g. FakeGpioChip. For
+    a real chip without a Pi, the kernel gpio-sim module provides one.
+    Pin numbers are line offsets on the chip (= BCM numbers on gpiochip0).
+    """
+
+    BOARD, BCM = 10, 11
+    OUT, IN = 0, 1
+    LOW, HIGH = 0, 1
+    PUD_OFF, PUD_DOWN, PUD_UP = 20, 21, 22
+    RISING, FALLING, BOTH = 31, 32, 33
+
+    def __init__(self, chip='/dev/gpiochip0', consumer='enme441'):
+        if isinstance(chip, str):
+            import gpiod
+            from gpiod.line import Direction, Value, Edge, Bias
+            self.lib = SimpleNamespace(LineSettings=gpiod.LineSettings, Direction=Direction,
+                                       Value=Value, Edge=Edge, Bias=Bias)
+            chip = gpiod.Chip(chip)
+        else:
+            self.lib = chip
+        self.chip = chip
+        self.consumer = consumer
+        self.requests = {}        # pin -> line request holding it
+        self.setupArgs = {}       # pin -> (mode, pull_up_down) it was set up with
+        self.edgeRequests = {}    # pin -> request with edge detection on
+        self.callbacks = {}       # pin -> callback
+        self.eventThread = None
+        self.running = False
+
+    def setmode(self, mode):
+        if mode != self.BCM:
+            raise ValueError('GpiodGPIO only supports BCM (line offset) numbering')
+
+    def setwarnings(self, flag):
+        pass
+
+    def __settings(self, mode, pull_up_down=None, initial=None, edge=None, bouncetime=None):
+        lib = self.lib
+        kw = {}
+        if mode == self.OUT:
+            kw['direction'] = lib.Direction.OUTPUT
+            kw['output_value'] = lib.Value.ACTIVE if initial else lib.Value.INACTIVE
+        else:
+            kw['direction'] = lib.Direction.INPUT
+        if pull_up_down is not None:
+            kw['bias'] = {self.PUD_OFF: lib.Bias.DISABLED, self.PUD_DOWN: lib.Bias.PULL_DOWN,
+                          self.PUD_UP: lib.Bias.PULL_UP}[pull_up_down]
+        if edge is not None:
+            kw['edge_detection'] = {self.RISING: lib.Edge.RISING, self.FALLING: lib.Edge.FALLING,
+                                    self.BOTH: lib.Edge.BOTH}[edge]
+            if bouncetime:
+                kw['debounce_period'] = timedelta(milliseconds=bouncetime)
+        return lib.LineSettings(**kw)
+
+    # Request pins as one line group:
+    def setup(self, pin, mode, pull_up_down=None, initial=None):
+        pins = tuple(pin) if isinstance(pin, (list, tuple)) else (pin,)
+        for p in pins:
+            if p in self.requests:
+                raise ValueError(f'pin {p} is already set up')
+        req = self.chip.request_lines(config={pins: self.__settings(mode, pull_up_down, initial)},
+                                      consumer=self.consumer)
+        for p in pins:
+            self.requests[p] = req
+            self.setupArgs[p] = (mode, pull_up_down)
+
+    def output(self, pin, value):
+        Value = self.lib.Value
+        if isinstance(pin, (list, tuple)):   # one set_values() per line group
+            if not isinstance(value, (list, tuple)):
+                value = [value]*len(pin)
+            groups = {}
+            for p, v in zip(pin, value):
+                req = self.requests[p]
+                groups.setdefault(id(req), (req, {}))[1][p] = Value.ACTIVE if v else Value.INACTIVE
+            for req, values in groups.values():
+                req.set_values(values)
+            return
+        self.requests[pin].set_value(pin, Value.ACTIVE if value else Value.INACTIVE)
+
+    def input(self, pin):
+        return 1 if self.requests[pin].get_value(pin) == self.lib.Value.ACTIVE else 0
+
+    # Levels of several pins, one get_values() per line group:
+    def readPins(self, pins):
+        groups = {}
+        for p in pins:
+            req = self.requests[p]
+            groups.setdefault(id(req), (req, []))[1].append(p)
+        levels = {}
+        for req, ps in groups.values():
+            for p, v in zip(ps, req.get_values(ps)):
+                levels[p] = 1 if v == self.lib.Value.ACTIVE else 0
+        return [levels[p] for p in pins]
+
+    # Turn on edge detection for an input pin (re-requesting it on its own)
+    # and call callback(pin) from the event thread on each edge:
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        mode, pud = self.setupArgs.get(pin, (self.IN, None))
+        req = self.requests.pop(pin, None)
+        if req is not None:
+            if any(r is req for p, r in self.requests.items()):
+                self.requests[pin] = req
+                raise ValueError(f'pin {pin} is part of a line group; set it up on its own for events')
+            req.release()
+        self.requests[pin] = self.chip.request_lines(
+            config={(pin,): self.__settings(self.IN, pud, edge=edge, bouncetime=bouncetime)},
+            consumer=self.consumer)
+        self.edgeRequests[pin] = self.requests[pin]
+        if callback is not None:
+            self.callbacks[pin] = callback
+            if self.eventThread is None:
+                self.running = True
+                self.eventThread = threading.Thread(target=self.__dispatch, daemon=True)
+                self.eventThread.start()
+
+    def remove_event_detect(self, pin):
+        self.callbacks.pop(pin, None)
+
+    # Read all pending edge events (waiting up to timeout seconds for the
+    # first), in batches of up to max_events per line request. Returns a
+    # list of (kernel timestamp_ns, pin, 1 for rising / 0 for falling).
+    def readEvents(self, timeout=0.0, max_events=64):
+        events = []
+        for req in list(self.edgeRequests.values()):
+            if req.wait_edge_events(timeout):
+                for ev in req.read_edge_events(max_events):
+                    events.append((ev.timestamp_ns, ev.line_offset,
+                                   1 if ev.event_type.name.startswith('RISING') else 0))
+            timeout = 0.0                  # only wait once per call
+        events.sort()
+        return events
+
+    def __dispatch(self):
+        while self.running:
+            for t, pin, rising in self.readEvents(timeout=0.01):
+                callback = self.callbacks.get(pin)
+                if callback is not None:
+                    callback(pin)
+
+    def PWM(self, pin, freq):
+        raise NotImplementedError('libgpiod has no PWM; use RPi.GPIO or the PWM sysfs interface')
+
+    def cleanup(self, pin=None):
+        if pin is None:
+            self.running = False
+            if self.eventThread is not None:
+                self.eventThread.join()
+                self.eventThread = None
+            for req in {id(r): r for r in self.requests.values()}.values():
+                req.release()
+            self.requests.clear()
+            self.edgeRequests.clear()
+            self.callbacks.clear()
+        else:
+            self.callbacks.pop(pin, None)
+
+
+class FakeGpioChip:
+    """
+    Stand-in for a gpiod.Chip, enough for GpiodGPIO. Every set_values() /
+    set_value() call is logged in `calls` as (monotonic_ns, {pin: level})
+    so group writes can be checked, and drive() changes an input level and
+    queues edge events for lines requested with edge detection.
+    """
+
+    class Direction(Enum):
+        AS_IS = 1
+        INPUT = 2
+        OUTPUT = 3
+
+    class Value(Enum):
+        INACTIVE = 0
+        ACTIVE = 1
+
+    class Edge(Enum):
+        NONE = 1
+        RISING = 2
+        FALLING = 3
+        BOTH = 4
+
+    class Bias(Enum):
+        AS_IS = 1
+        UNKNOWN = 2
+        DISABLED = 3
+        PULL_UP = 4
+        PULL_DOWN = 5
+
+    class EventType(Enum):
+        RISING_EDGE = 1
+        FALLING_EDGE = 2
+
+    class LineSettings(SimpleNamespace):
+        pass
+
+    def __init__(self):
+        self.levels = {}
+        self.calls = []
+        self.open = []            # live requests
+
+    def request_lines(self, config, consumer=None):
+        req = FakeLineRequest(self, config)
+        self.open.append(req)
+        return req
+
+    def drive(self, pin, level):
+        level = 1 if level else 0
+        if self.levels.get(pin, 0) == level:
+            return
+        self.levels[pin] = level
+        for req in self.open:
+            req.edge(pin, level)
+
+
+class FakeLineRequest:
+    def __init__(self, chip, config):
+        self.chip = chip
+        self.settings = {}
+        for pins, settings in config.items():
+            for p in pins:
+                self.settings[p] = settings
+                if getattr(settings, 'direction', None) == chip.Direction.OUTPUT:
+                    chip.levels[p] = 1 if settings.output_value == chip.Value.ACTIVE else 0
+        self.events = []
+
+    def set_values(self, values):
+        levels = {p: 1 if v == self.chip.Value.ACTIVE else 0 for p, v in values.items()}
+        self.chip.levels.update(levels)
+        self.chip.calls.append((monotonic_ns(), levels))
+
+    def set_value(self, pin, value):
+        self.set_values({pin: value})
+
+    def get_value(self, pin):
+        return self.chip.Value.ACTIVE if self.chip.levels.get(pin, 0) else self.chip.Value.INACTIVE
+
+    def get_values(self, pins):
+        return [self.get_value(p) for p in pins]
+
+    def edge(self, pin, level):
+        edge = getattr(self.settings.get(pin), 'edge_detection', None)
+        Edge = self.chip.Edge
+        if edge == Edge.BOTH or edge == (Edge.RISING if level else Edge.FALLING):
+            kind = self.chip.EventType.RISING_EDGE if level else self.chip.EventType.FALLING_EDGE
+            self.events.append(SimpleNamespace(event_type=kind, timestamp_ns=monotonic_ns(), line_offset=pin))
+
+    def wait_edge_events(self, timeout=None):
+        if not self.events and timeout:
+            sleep(timeout.total_seconds() if isinstance(timeout, timedelta) else timeout)
+        return bool(self.events)
+
+    def read_edge_events(self, max_events=None):
+        n = len(self.events) if max_events is None else max_events
+        batch, self.events = self.events[:n], self.events[n:]
+        return batch
+
+    def release(self):
+        if self in self.chip.open:
+            self.chip.open.remove(self)
+
+
+class FileSpiDev:
+    """
+    Stand-in for spidev.SpiDev that captures every transfer.
+
+    Each transfer is kept in `transfers` (as bytes) and, if a path is
+    given, appended to that file so a run can be inspected afterwards.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.file = open(path, 'ab') if path else None
+        self.transfers = []
+        self.max_speed_hz = 0
+        self.mode = 0
+        self.lsbfirst = False
+        self.bus = self.device = None
+
+    def open(self, bus, device):
+        self.bus, self.device = bus, device
+
+    def writebytes2(self, data):
+        data = bytes(data)
+        self.transfers.append(data)
+        if self.file:
+            self.file.write(data)
+            self.file.flush()
+
+    def writebytes(self, data):
+        self.writebytes2(data)
+
+    def xfer2(self, data):
+        self.writebytes2(data)
+        return [0]*len(data)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+# Example:
+#
+# from gpio_backends import SimGPIO
+# from shifter import Shifter
+# gpio = SimGPIO()
+# s = Shifter(data=16, clock=20, latch=21, gpio=gpio)
+# s.shiftFrames(range(256))
+# latches = gpio.risingEdges(21)
+# print((latches[-1] - latches[0]) / (len(latches) - 1), 'ns per frame')
@@ -7,10 +7,16 @@
 # used instead of multiprocessing. However, the GIL makes the motor process run 
 # too slowly on the Pi Zero, so multiprocessing is needed.
 
-import time
+import sys
 import multiprocessing
-import RPi.GPIO as GPIO
-from Lab8.Orignials.shifterOriginal import Shifter   # our custom Shifter class
+from gpio_backends import default_backend, SimGPIO
+from shifter import Shifter   # our custom Shifter class
+from step_timing import StepScheduler
+import motion_profile
+from move_worker import MoveWorker
+import motor_table
+import drive_modes
+import trajectory
 
 class Stepper:
     """
@@ -32,110 +38,261 @@ class Stepper:
     An instance attribute (shifter_bit_start) tracks the bit position
     in the shift register where the 4 control bits for each motor
     begin.
+
+    A second class attribute (motors) holds every motor's position,
+    queued target, sequence state and step count as whole steps in one
+    shared-memory table (see motor_table.py); angle is worked out from
+    the position when read.
     """
 
     # Class attributes:
     num_steppers = 0      # track number of Steppers instantiated
-    # CHANGED: make shared across processes
-    shifter_outputs = multiprocessing.Value('I', 0)   # track shift register outputs for all motors
-    seq = [0b0001,0b0011,0b0010,0b0110,0b0100,0b1100,0b1000,0b1001] # CCW sequence
-    delay = 1200          # delay between motor steps [us]
-    steps_per_degree = 4096/360    # 4096 steps/rev * 1/360 rev/deg
+    # CHANGED: one shared byte per register (2 motors each) instead of a
+    # 32-bit int, so the chain can hold up to 2*max_registers motors and
+    # each frame goes straight to Shifter.shiftBytes()
+    max_registers = 8
+    shifter_outputs = multiprocessing.Array('B', max_registers, lock=False)   # track shift register outputs for all motors
+    motors = motor_table.new_table(2*max_registers)   # position/target/state/steps for all motors
+    outputs_lock = multiprocessing.Lock()   # guards shifter_outputs for motors given no lock
+    seq = list(drive_modes.HALF)   # CCW sequence (default half-step mode)
+    delay = 1200          # delay between half steps [us] (also the no-stall start speed)
+    steps_per_degree = drive_modes.steps_per_degree('half')    # 4096 steps/rev * 1/360 rev/deg
+    vmax = 120            # default cruise speed for profiled moves [deg/s]
+    accel = 720           # default acceleration for profiled moves [deg/s^2]
 
-    def __init__(self, shifter, lock):
+    # lock guards shifter_outputs and the Shifter between motors; with
+    # lock=None the motors share Stepper.outputs_lock. If an OutputDaemon
+    # is given, steps are published to its shared slot for this motor
+    # instead of being shifted here, and the lock is not used.
+    #
+    # With profile='trapezoid' or 'scurve', moves start and stop at the
+    # Stepper.delay speed and accelerate up to vmax [deg/s] in between,
+    # limited to accel [deg/s^2] (see motion_profile.py); with
+    # profile=None every step takes Stepper.delay. vmax must be above
+    # that start speed, or the profile could never accelerate.
+    #
+    # mode picks the coil sequence (see drive_modes.py): 'half' (4096
+    # steps/rev), 'full' two-phase or 'wave' (2048 steps/rev each). Full
+    # stepping needs half the shifts per revolution and has more torque
+    # at speed. Stepper.delay is per half step, so every mode starts at
+    # the same shaft speed (self.delay is per step of this motor's mode).
+    #
+    # With a step_trace.StepRecorder, every step is also logged (time,
+    # motor, coil pattern and the frame shifted out) for later replay and
+    # analysis.
+    def __init__(self, shifter, lock=None, daemon=None, profile=None, vmax=None, accel=None, mode='half',
+                 recorder=None):
+        self.mode = mode
+        self.seq = drive_modes.sequence(mode)     # coil sequence for this motor
+        self.steps_per_degree = drive_modes.steps_per_degree(mode)
+        self.delay = drive_modes.step_delay(Stepper.delay, mode)   # [us] per step of our mode
         self.s = shifter           # shift register
         # self.angle = 0             # current output shaft angle
-        self.angle = multiprocessing.Value('d', 0.0)
-        self.step_state = 0        # track position in sequence
         self.shifter_bit_start = 4*Stepper.num_steppers  # starting bit position
-        self.lock = lock           # multiprocessing lock
+        self.lock = lock if lock is not None else Stepper.outputs_lock   # multiprocessing lock
+        self.daemon = daemon       # shift register output daemon (optional)
+        self.recorder = recorder   # step trace log (optional)
+        self.slot = Stepper.num_steppers   # our slot in the daemon
+        self.scheduler = StepScheduler()   # step deadlines + timing stats of the last move
+        if profile is not None and profile not in motion_profile.PROFILES:
+            raise ValueError(f'unknown profile {profile!r} (expected one of {motion_profile.PROFILES})')
+        self.profile = profile
+        self.vmax = vmax if vmax is not None else Stepper.vmax
+        self.accel = accel if accel is not None else Stepper.accel
+        if self.vmax <= 0 or self.accel <= 0:
+            raise ValueError(f'vmax and accel must be positive, got {self.vmax} and {self.accel}')
+        v0 = 1e6/self.delay/self.steps_per_degree     # start speed [deg/s]
+        if profile is not None and self.vmax <= v0:
+            raise ValueError(f'vmax {self.vmax} deg/s is not above the {v0:.1f} deg/s start speed, '
+                             f'so the {profile} profile would never accelerate')
+        self.worker = MoveWorker(self.__command)   # runs our moves in order, in one process
+        if self.shifter_bit_start >= 8*shifter.numRegisters:
+            raise ValueError('not enough shift registers in the chain for another motor')
+        # CHANGED: our record in the shared motor table instead of a
+        # lock-protected float angle per motor
+        self.row = Stepper.motors[self.slot]
+        motor_table.reset(self.row)
+        self.reg = self.shifter_bit_start // 8          # which register byte
+        self.frame = memoryview(Stepper.shifter_outputs)[:shifter.numRegisters]   # the chain's bytes, no copy
+        if recorder is not None and self.slot >= recorder.motors:
+            raise ValueError(f'step recorder has rings for {recorder.motors} motors only')
+        self.mask = 0b1111 << (self.shifter_bit_start % 8)   # which nibble of that byte
 
         Stepper.num_steppers += 1   # increment the instance count
 
+    # Current output shaft angle [deg], from the step count:
+    @property
+    def angle(self):
+        return motor_table.angle(self.row.position, self.steps_per_degree)
+
+    # Current position [steps from zero]:
+    @property
+    def position(self):
+        return self.row.position
+
+    # Position in the coil sequence:
+    @property
+    def step_state(self):
+        return self.row.state
+
+    @step_state.setter
+    def step_state(self, value):
+        self.row.state = value
+
     # Signum function:
     def __sgn(self, x):
         if x == 0: return(0)
         else: return(int(abs(x)/x))
 
     # Move a single +/-1 step in the motor sequence:
-    def __step(self, dir):
-        self.step_state += dir    # increment/decrement the step
-        self.step_state %= 8      # ensure result stays in [0,7]
+    # CHANGED: step k of trajectory t, which already holds the sequence
+    # state, pattern and position for every step, so this only looks
+    # them up
+    def __step(self, t, k):
+        row = self.row
+        row.state = t.states[k]         # position in the sequence
+        row.position = t.positions[k]   # exact: whole steps, no float rounding
+        row.steps += 1
+
+        if self.daemon is not None:   # the daemon composes and latches the frame
+            self.daemon.publish(self.slot, t.patterns[k])
+            if self.recorder is not None:
+                self.recorder.record(self.slot, t.patterns[k])
+            return
 
         # CHANGED: update only our 4-bit nibble under a tiny critical section
-        mask = 0b1111 << self.shifter_bit_start
-        new_bits = Stepper.seq[self.step_state] << self.shifter_bit_start
+        idx = self.reg
+        mask = self.mask
         with self.lock:
-            cur = Stepper.shifter_outputs.value
-            cur &= ~mask          # clear only our nibble
-            cur |= new_bits       # set our new pattern
-            Stepper.shifter_outputs.value = cur
-            self.s.shiftByte(cur) # push combined outputs
-            self.angle.value = (self.angle.value + dir/Stepper.steps_per_degree) % 360
+            outputs = Stepper.shifter_outputs
+            outputs[idx] = (outputs[idx] & ~mask) | t.nibbles[k]   # only our nibble
+            self.s.shiftBytes(self.frame) # push combined outputs
+            if self.recorder is not None:   # lock-free: we are the only writer of our ring
+                self.recorder.record(self.slot, t.patterns[k], self.frame)
 
         #self.angle += dir/Stepper.steps_per_degree
         #self.angle %= 360         # limit to [0,359.9+] range
 
-    # Move relative angle from current position:
-    def __rotate(self, delta):
+    # Take a signed number of steps:
+    def __rotate(self, steps):
         # CHANGED: do not hold the lock for the entire move; let motors interleave
-        numSteps = int(Stepper.steps_per_degree * abs(delta))    # find the right # of steps
-        dir = self.__sgn(delta)        # find the direction (+/-1)
-        for s in range(numSteps):      # take the steps
-            self.__step(dir)
-            time.sleep(Stepper.delay/1e6)
+        numSteps = abs(steps)
+        intervals = self.__intervals(numSteps)
+        # CHANGED: work out the whole move up front (trajectory.py) and
+        # check it before the first step; the timed loop only indexes it
+        t = trajectory.plan_move(self, steps, intervals, self.s.numRegisters)
+        t.validate(max(self.vmax*self.steps_per_degree, 1e6/self.delay))   # as fast as a profile may go
+        # CHANGED: take the steps on absolute deadlines instead of sleeping
+        # self.delay after each one, so shift/lock time doesn't add up
+        worker = self.worker
+        ks = iter(range(numSteps))
+        def step():
+            worker.started()           # dispatch-to-first-step latency (first call only)
+            self.__step(t, next(ks))
+        self.scheduler.run(numSteps, intervals, step)
+
+    # Wait after each step of a move [us]: the profile's (cached) interval
+    # table, or self.delay throughout:
+    def __intervals(self, numSteps):
+        if self.profile is None:
+            return self.delay
+        spd = self.steps_per_degree
+        return motion_profile.intervals(self.profile, numSteps, self.vmax*spd,
+                                        self.accel*spd, 1e6/self.delay)
+
+    # Run one queued move (in the worker process). If it fails, the steps
+    # it didn't take come off the queued target again, so later moves are
+    # planned from where the shaft will really be:
+    def __command(self, cmd, steps):
+        row = self.row
+        start = row.position
+        try:
+            self.__rotate(steps)
+        except Exception:
+            row.target -= steps - (row.position - start)
+            raise
 
-    # Move relative angle from current position:
+    # Move relative angle from the end of the last queued move:
+    # CHANGED: queue the move for this motor's worker process instead of
+    # sleeping and starting a new Process per move. Returns a MoveHandle
+    # right away (handle.wait(timeout) / handle.done(); wait() raises
+    # if the move failed).
     def rotate(self, delta):
-        time.sleep(0.1)
-        p = multiprocessing.Process(target=self.__rotate, args=(delta,))
-        p.start()
+        steps = int(self.steps_per_degree * abs(delta)) * self.__sgn(delta)   # find the right # of steps
+        self.row.target += steps
+        return self.worker.submit('steps', steps)
 
-    # Move to an absolute angle taking the shortest possible path:
+    # Move to an absolute angle taking the shortest possible path. The
+    # path is planned from where the moves already queued will leave the
+    # shaft, not from where it is right now:
     def goAngle(self, angle):
-        current = self.angle.value
-        delta = ((angle - current + 180) % 360) - 180 # maps the difference into the interval (−180, 180), so the motor always chooses the shortest direction
-        self.rotate(delta)
-    
+        target = motor_table.angle(self.row.target, self.steps_per_degree)
+        delta = ((angle - target + 180) % 360) - 180 # maps the difference into the interval (−180, 180), so the motor always chooses the shortest direction
+        return self.rotate(delta)
 
-    # Set the motor zero point
+    # Block until all moves queued so far are done, or timeout [s]
+    # passes; True if they are done:
+    def wait(self, timeout=None):
+        return self.worker.wait(timeout)
+
+    # Finish the queued moves and end the worker process:
+    def stop(self):
+        self.worker.stop()
+
+    # Dispatch-to-first-step latency (and queue wait) of the moves so far:
+    def latency(self):
+        return self.worker.latency()
+
+    # Set the motor zero point (with no moves queued)
     def zero(self):
-        self.angle.value = 0.0
+        self.row.position = 0
+        self.row.target = 0
+
+    # Step timing (jitter/overrun histograms, drift) of the last move:
+    def moveStats(self):
+        return self.scheduler.stats()
 
 
 # Example use:
 if __name__ == '__main__':
     try:
+        # Run with --sim to use the in-memory GPIO backend (no Pi needed):
+        GPIO = SimGPIO() if '--sim' in sys.argv else default_backend()
         GPIO.setmode(GPIO.BCM)
-        s = Shifter(data=16, latch=20, clock=21)
+        s = Shifter(data=16, latch=20, clock=21, gpio=GPIO)
         lock = multiprocessing.Lock()
+
+        # Run with --trace FILE to log every step (see step_trace.py):
+        recorder = None
+        if '--trace' in sys.argv:
+            from step_trace import StepRecorder
+            recorder = StepRecorder(sys.argv[sys.argv.index('--trace') + 1])
         
-        m1 = Stepper(s, lock)
-        m2 = Stepper(s, lock)
+        m1 = Stepper(s, lock, recorder=recorder)
+        m2 = Stepper(s, lock, recorder=recorder)
 
         m1.zero()
         m2.zero()
 
         print("Starting simultaneous moves...")
         
-        # Create processes manually so we can start them together
-        # Example: Move m1 to 90 and m2 to -90 at the same time
-        p1 = multiprocessing.Process(target=m1.goAngle, args=(90,))
-        p2 = multiprocessing.Process(target=m2.goAngle, args=(-90,))
-        
-        p1.start()
-        p2.start()
-        
-        # Wait for both to finish before sending next command
-        p1.join()
-        p2.join()
+        # Each motor runs its moves in its own worker process, so these
+        # return right away and both motors move at the same time. Moves
+        # queue up per motor, each planned from where the one before ends:
+        m1.goAngle(90)
+        m1.goAngle(-45)
+        m2.goAngle(-90)
+        h = m2.goAngle(45)
         
-        print("Move complete. Doing next move...")
+        # Wait for just m2's second move:
+        h.wait()
+        print("m2 done. Waiting for m1...")
         
-        # Next move
-        p3 = multiprocessing.Process(target=m1.goAngle, args=(-45,))
-        p3.start()
-        p3.join()
+        # Wait for everything queued on m1 (up to 10 s):
+        if not m1.wait(timeout=10):
+            print("m1 still moving")
+        print(m1.moveStats())
+        print(m1.latency())
 
     except KeyboardInterrupt:
         print('\nStopping...')
@@ -0,0 +1,174 @@
+# Multiplexed LED matrix driver
+#
+# Drives a row/column-multiplexed LED matrix through chained shift
+# registers: the column registers hold the pattern for one row and the
+# row registers select which row is lit. A refresh thread scans the rows
+# one at a time on fixed deadlines, fast enough that the whole matrix
+# looks lit.
+#
+# Drawing goes to a back buffer; swap() makes it visible in one step, so
+# the refresh thread never shows a half-drawn frame.
+
+import time
+import threading
+
+class LedMatrix:
+    """
+    Framebuffer for a rows x cols LED matrix on a Shifter whose chain has
+    ceil(cols/8) column registers followed by ceil(rows/8) row registers,
+    i.e. each whole-chain frame is column bytes then row-select bytes
+    (frame[0] goes to the register furthest down the chain, as with
+    Shifter.shiftBytes()).
+
+    Buffers are bytearrays of one bit per LED, row by row (bit x of byte
+    y*colBytes + x//8). col_active_low/row_active_low invert the outputs
+    for matrices that light an LED with a low column or row line.
+
+    stats() reports the measured refresh rate (rows actually shown per
+    second / rows, so dropped rows lower it) and dropped rows (row slots
+    skipped because the refresh thread fell behind its deadlines).
+    """
+
+    def __init__(self, shifter, rows=8, cols=8, refresh_hz=100,
+                 col_active_low=False, row_active_low=False):
+        self.s = shifter
+        self.rows = rows
+        self.cols = cols
+        self.colBytes = (cols + 7)//8
+        self.rowBytes = (rows + 7)//8
+        if shifter.numRegisters != self.colBytes + self.rowBytes:
+            raise ValueError(f'a {rows}x{cols} matrix needs {self.colBytes + self.rowBytes} registers')
+        self.colInvert = 0xFF if col_active_low else 0
+        self.rowInvert = 0xFF if row_active_low else 0
+        self.refreshHz = refresh_hz
+        self.front = bytearray(rows*self.colBytes)    # what is shown
+        self.back = bytearray(rows*self.colBytes)     # what is being drawn
+        self.scanFrames = self.__scanFrames(self.front)
+        self.scans = 0                 # passes through all the row slots
+        self.rowsShown = 0             # rows actually shifted out
+        self.dropped = 0               # row slots skipped
+        self.startTime = None
+        self.thread = None
+        self.running = False
+
+    # Whole-chain frame for every row of buf, built once per swap() so the
+    # refresh loop only has to index a list:
+    def __scanFrames(self, buf):
+        frames = []
+        cb = self.colBytes
+        for y in range(self.rows):
+            cols = bytes(b ^ self.colInvert for b in buf[y*cb:(y+1)*cb])
+            select = bytearray(self.rowBytes)
+            select[y//8] = 1 << (y % 8)
+            frames.append(cols + bytes(b ^ self.rowInvert for b in select))
+        return frames
+
+    # Drawing (back buffer):
+    def setPixel(self, x, y, on=True):
+        i = y*self.colBytes + x//8
+        if on:
+            self.back[i] |= 1 << (x % 8)
+        else:
+            self.back[i] &= ~(1 << (x % 8))
+
+    def getPixel(self, x, y):
+        return (self.back[y*self.colBytes + x//8] >> (x % 8)) & 1
+
+    # Set a whole row from an int (bit x = column x):
+    def setRow(self, y, bits):
+        cb = self.colBytes
+        self.back[y*cb:(y+1)*cb] = (bits & ((1 << self.cols) - 1)).to_bytes(cb, 'little')
+
+    def clear(self):
+        self.back[:] = bytes(len(self.back))
+
+    # Show the back buffer. The old front buffer becomes the new back
+    # buffer; with copy=True it is first filled with the frame just shown,
+    # so drawing can continue incrementally.
+    def swap(self, copy=False):
+        frames = self.__scanFrames(self.back)
+        self.front, self.back = self.back, self.front
+        self.scanFrames = frames       # one reference swap for the refresh loop, no lock needed
+        if copy:
+            self.back[:] = self.front
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.__refresh, daemon=True)
+        self.thread.start()
+
+    def stop(self, blank=True):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if blank:
+            self.s.shiftBytes(bytes([self.colInvert]*self.colBytes + [self.rowInvert]*self.rowBytes))
+
+    # Refresh loop: one row per slot of 1/(refresh_hz*rows) s on absolute
+    # deadlines. Rows whose slot has already passed are skipped (counted
+    # as dropped) rather than shown late, so the scan stays in step.
+    def __refresh(self):
+        slot = int(1e9/(self.refreshHz*self.rows))   # [ns]
+        shift = self.s.shiftBytes
+        row = 0
+        self.startTime = time.monotonic_ns()
+        deadline = self.startTime
+        while self.running:
+            shift(self.scanFrames[row])
+            self.rowsShown += 1
+            row += 1
+            deadline += slot
+            now = time.monotonic_ns()
+            if now > deadline + slot:            # missed whole slots
+                missed = (now - deadline)//slot
+                self.dropped += missed
+                row += missed
+                deadline += missed*slot
+            if row >= self.rows:
+                self.scans += row // self.rows
+                row %= self.rows
+            wait = deadline - time.monotonic_ns()
+            if wait > 0:
+                time.sleep(wait/1e9)
+
+    def stats(self):
+        elapsed = (time.monotonic_ns() - self.startTime)/1e9 if self.startTime else 0
+        return {
+            'target_hz': self.refreshHz,
+            'refresh_hz': self.rowsShown/self.rows/elapsed if elapsed else 0.0,
+            'scans': self.scans,
+            'dropped_rows': self.dropped,
+        }
+
+
+# Example use (add --sim to run off the Pi): a dot bouncing around an
+# 8x8 matrix with columns on the far register and rows on the near one.
+if __name__ == '__main__':
+    import sys
+    from gpio_backends import default_backend, SimGPIO
+    from shifter import Shifter
+
+    GPIO = SimGPIO() if '--sim' in sys.argv else default_backend()
+    try:
+        GPIO.setmode(GPIO.BCM)
+        s = Shifter(data=16, latch=20, clock=21, registers=2, gpio=GPIO)
+        m = LedMatrix(s, rows=8, cols=8, refresh_hz=100)
+        m.start()
+        x, y, dx, dy = 0, 0, 1, 1
+        for i in range(100):
+            m.clear()
+            m.setPixel(x, y)
+            m.swap()
+            if not 0 <= x + dx < 8: dx = -dx
+            if not 0 <= y + dy < 8: dy = -dy
+            x, y = x + dx, y + dy
+            time.sleep(0.05)
+        m.stop()
+        print(m.stats())
+    except KeyboardInterrupt:
+        print('\nStopping...')
+    finally:
+        GPIO.cleanup()
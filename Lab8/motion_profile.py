@@ -0,0 +1,94 @@
+# Acceleration-limited motion profiles
+#
+# A stepper can only start (and stop) at its slow no-stall speed, but
+# once moving it can be accelerated well past it. These profiles turn a
+# move of n steps into a table of step intervals that ramps up from the
+# start speed to a cruise speed and back down:
+#
+#   trapezoid  - constant acceleration, then cruise, then constant
+#                deceleration
+#   scurve     - jerk-limited: the acceleration itself ramps smoothly up
+#                and back down (sine-shaped), so there is no sudden jump
+#                in torque at the ends of the ramps
+#
+# Speeds are in steps/s and accelerations in steps/s^2. If the move is
+# too short to reach vmax, the profile peaks lower (triangle-shaped).
+# Tables are cached per (steps, vmax, accel), so repeated moves of the
+# same length cost nothing to plan.
+
+import math
+from functools import lru_cache
+
+PROFILES = ('trapezoid', 'scurve')
+
+# Step times (from the start of the ramp) for the first num_steps steps of
+# a ramp with position pos(t) and speed vel(t), found with Newton's method
+# from the previous step's time (pos is increasing, so this converges in
+# a few iterations):
+def _ramp_times(num_steps, pos, vel, t_end):
+    times = []
+    t = 0.0
+    for k in range(1, num_steps + 1):
+        for i in range(20):
+            dt = (pos(t) - k)/vel(t)
+            t = min(max(t - dt, 0.0), t_end)
+            if abs(dt) < 1e-9:
+                break
+        times.append(t)
+    return times
+
+# Whole-move interval table [us] from the ramp step times (interval k is
+# the wait after step k): the deceleration mirrors the ramp, and the
+# cruise steps come every 1/vpeak.
+def _intervals(steps, ramp, vpeak):
+    n = len(ramp)
+    up = [1e6*(b - a) for a, b in zip([0.0] + ramp, ramp)]
+    cruise = [1e6/vpeak]*(steps - 2*n)
+    return tuple(up + cruise + up[::-1])
+
+@lru_cache(maxsize=128)
+def trapezoid(steps, vmax, accel, v0):
+    if steps <= 0:
+        return ()
+    vmax = max(vmax, v0)
+    vpeak = min(vmax, math.sqrt(v0*v0 + accel*steps))   # triangle if the move is short
+    t_end = (vpeak - v0)/accel
+    n = min(int((vpeak*vpeak - v0*v0)/(2*accel)), steps//2)
+    pos = lambda t: v0*t + accel*t*t/2
+    vel = lambda t: v0 + accel*t
+    return _intervals(steps, _ramp_times(n, pos, vel, t_end), vpeak)
+
+# The S-curve ramp takes the speed from v0 to vpeak along
+#   v(t) = v0 + (vpeak - v0)*(t/T - sin(2*pi*t/T)/(2*pi))
+# whose acceleration rises from 0 to a peak of accel at T/2 and falls
+# back to 0 at T (T = 2*(vpeak - v0)/accel); it covers (v0 + vpeak)*T/2
+# steps, twice as long as the trapezoid ramp to the same speed.
+@lru_cache(maxsize=128)
+def scurve(steps, vmax, accel, v0):
+    if steps <= 0:
+        return ()
+    vmax = max(vmax, v0)
+    vpeak = min(vmax, math.sqrt(v0*v0 + accel*steps/2))
+    if vpeak <= v0:
+        return tuple([1e6/v0]*steps)
+    T = 2*(vpeak - v0)/accel
+    dv = vpeak - v0
+    w = 2*math.pi/T
+    pos = lambda t: v0*t + dv*(t*t/(2*T) + (math.cos(w*t) - 1)/(w*w*T))
+    vel = lambda t: v0 + dv*(t/T - math.sin(w*t)/(2*math.pi))
+    n = min(int((v0 + vpeak)*T/2), steps//2)
+    return _intervals(steps, _ramp_times(n, pos, vel, T), vpeak)
+
+# Interval table [us] for a move of steps with the named profile:
+def intervals(profile, steps, vmax, accel, v0):
+    if profile == 'trapezoid':
+        return trapezoid(steps, vmax, accel, v0)
+    if profile == 'scurve':
+        return scurve(steps, vmax, accel, v0)
+    raise ValueError(f'unknown profile {profile!r} (expected one of {PROFILES})')
+
+
+# Example:
+#
+# t = trapezoid(2048, vmax=1500, accel=6000, v0=833)   # half a turn
+# print(f'{len(t)} steps in {sum(t)/1e6:.3f} s vs {2048/833:.3f} s at the start speed')
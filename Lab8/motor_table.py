@@ -0,0 +1,40 @@
+# Shared motor state table
+#
+# Keeping each motor's angle in its own lock-protected
+# multiprocessing.Value('d') costs a synchronized float write per step,
+# and adding 1/steps_per_degree and wrapping at 360 on every step slowly
+# drifts away from where the motor really is. Instead, all the motors of
+# a Stepper class share one array of fixed-size records in shared memory
+# (mapped once, inherited by every worker process), and positions are
+# whole step counts: angles are worked out from them when read, so they
+# are exact.
+#
+# Fields are 32-bit so reads and writes are single aligned word accesses
+# even on the Pi Zero's 32-bit ARM, and need no lock (each field has one
+# writer: the motor's worker for position/state/steps, the process that
+# queues the moves for target).
+
+import ctypes
+import multiprocessing
+
+class MotorState(ctypes.Structure):
+    _fields_ = [
+        ('position', ctypes.c_int32),   # steps from the zero point
+        ('target', ctypes.c_int32),     # position where the last queued move ends
+        ('state', ctypes.c_int32),      # index into the coil sequence
+        ('steps', ctypes.c_uint32),     # steps taken in total (odometer)
+    ]
+
+# Table of n motor records in shared memory:
+def new_table(n):
+    return multiprocessing.Array(MotorState, n, lock=False)
+
+def reset(row):
+    row.position = 0
+    row.target = 0
+    row.state = 0
+    row.steps = 0
+
+# Angle [deg] in [0, 360) for a position in steps:
+def angle(position, steps_per_degree):
+    return (position/steps_per_degree) % 360
@@ -0,0 +1,193 @@
+# Persistent move worker
+#
+# Starting a new multiprocessing.Process for every rotate() costs tens of
+# milliseconds of fork time on the Pi Zero (plus the 100 ms sleep before
+# it), and moves started back to back race each other for the motor. A
+# MoveWorker is one long-lived process per motor that takes its moves
+# from a queue and runs them strictly in order. Each submitted move gets
+# a MoveHandle, so callers can stream moves and wait only where they need
+# to.
+
+import time
+import traceback
+import multiprocessing
+
+# Indices into the shared latency stats:
+LAST, SUM, MAX, COUNT, WAIT_LAST, WAIT_MAX = range(6)
+
+class MoveHandle:
+    """
+    Future-like handle for one submitted command. Commands finish in the
+    order they were submitted, so command k is done once the worker has
+    finished k commands. A command that raised is done too: wait()
+    re-raises its exception, and exception() returns it.
+    """
+
+    def __init__(self, worker, seq):
+        self.worker = worker
+        self.seq = seq
+
+    def done(self):
+        return self.worker.finished.value >= self.seq
+
+    # Block until the command is done, or timeout [s] passes; True if it
+    # is done, raises the command's exception if it failed:
+    def wait(self, timeout=None):
+        if not self.worker.waitFor(self.seq, timeout):
+            return False
+        error = self.worker.error(self.seq)
+        if error is not None:
+            raise error
+        return True
+
+    # The exception the command raised, or None (also while it runs):
+    def exception(self):
+        return self.worker.error(self.seq) if self.done() else None
+
+
+class MoveWorker:
+    """
+    Runs handler(cmd, arg) in a worker process for every command given to
+    submit(), one at a time in the order submitted. The process is started
+    on the first submit() (from the process that owns the motor) and runs
+    until stop().
+
+    If the handler raises, the traceback is printed in the worker, the
+    queue keeps running, and the exception is sent back to the owner:
+    the command's MoveHandle.wait() re-raises it, and so does the next
+    wait() on the worker if no handle has.
+
+    latency() is the dispatch latency: from the time a command could
+    start (its submit(), or the end of the command before it if it had to
+    queue behind one) to the time the handler reports with started() for
+    that command, i.e. the worker's own overhead plus the time to plan the
+    move. Time spent queued behind earlier commands is reported apart, as
+    queue_wait.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.queue = multiprocessing.Queue()
+        self.submittedCount = 0    # commands submitted (owner side)
+        self.finished = multiprocessing.Value('q', 0, lock=False)   # commands finished
+        self.cond = multiprocessing.Condition()   # notified as each command finishes
+        self.lat = multiprocessing.Array('q', 6, lock=False)   # [ns], written by the worker only
+        self.errors = multiprocessing.SimpleQueue()   # (seq, exception) of failed commands, worker -> owner
+        self.failed = {}           # seq -> exception, drained from errors (owner side)
+        self.reported = set()      # failures already raised to the owner
+        self.submitted = None      # time the command being run could start (worker side)
+        self.p = None
+
+    def start(self):
+        if self.p is None:
+            self.p = multiprocessing.Process(target=self.__run, daemon=True)
+            self.p.start()
+
+    # Queue a command; returns its MoveHandle right away:
+    def submit(self, cmd, arg):
+        self.start()
+        self.submittedCount += 1
+        self.queue.put((cmd, arg, time.monotonic_ns()))
+        return MoveHandle(self, self.submittedCount)
+
+    # Called by the handler (in the worker) when the command's first step
+    # is taken, at time t (default now); later calls for the same command
+    # are ignored:
+    def started(self, t=None):
+        if self.submitted is None:
+            return
+        lat = (t if t is not None else time.monotonic_ns()) - self.submitted
+        self.submitted = None
+        l = self.lat
+        l[LAST] = lat
+        l[SUM] += lat
+        l[COUNT] += 1
+        if lat > l[MAX]:
+            l[MAX] = lat
+
+    # Block until at least seq commands have finished, or timeout [s]
+    # passes; True if they have:
+    def waitFor(self, seq, timeout=None):
+        with self.cond:
+            return self.cond.wait_for(lambda: self.finished.value >= seq, timeout)
+
+    # Exception raised by command seq, or None (owner side; only final
+    # once the command is done):
+    def error(self, seq):
+        while not self.errors.empty():
+            n, e = self.errors.get()
+            self.failed[n] = e
+        e = self.failed.get(seq)
+        if e is not None:
+            self.reported.add(seq)
+        return e
+
+    # Block until every command submitted so far has finished (or timeout);
+    # raises the first failure not already raised through its handle:
+    def wait(self, timeout=None):
+        if not self.waitFor(self.submittedCount, timeout):
+            return False
+        self.error(None)          # collect the failures
+        for seq in sorted(self.failed):
+            if seq not in self.reported:
+                raise self.error(seq)
+        return True
+
+    # Finish the queued commands, then end the worker:
+    def stop(self):
+        if self.p is not None:
+            self.queue.put(None)
+            self.p.join()
+            self.p = None
+
+    def __run(self):
+        seq = 0
+        free = 0                  # when the last command finished
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            seq += 1
+            cmd, arg, submitted = item
+            self.submitted = max(submitted, free)  # dispatch starts once the worker is free
+            wait = max(free - submitted, 0)        # queued behind earlier commands
+            self.lat[WAIT_LAST] = wait
+            if wait > self.lat[WAIT_MAX]:
+                self.lat[WAIT_MAX] = wait
+            try:
+                self.handler(cmd, arg)
+            except Exception as e:
+                traceback.print_exc()     # report a bad move, keep running the queue
+                try:
+                    self.errors.put((seq, e))   # before finished moves on, so waiters see it
+                except Exception:         # exception that can't be pickled
+                    self.errors.put((seq, RuntimeError(f'{type(e).__name__}: {e}')))
+            finally:
+                free = time.monotonic_ns()
+                with self.cond:
+                    self.finished.value += 1
+                    self.cond.notify_all()
+
+    def latency(self):
+        l = self.lat
+        return {
+            'moves': l[COUNT],
+            'last_ms': round(l[LAST]/1e6, 3),
+            'avg_ms': round(l[SUM]/l[COUNT]/1e6, 3) if l[COUNT] else 0.0,
+            'max_ms': round(l[MAX]/1e6, 3),
+            'queue_wait_last_ms': round(l[WAIT_LAST]/1e6, 3),
+            'queue_wait_max_ms': round(l[WAIT_MAX]/1e6, 3),
+        }
+
+
+# Example:
+#
+# def handler(cmd, arg):
+#     w.started()            # right before the first step
+#     ...                    # take the steps
+# w = MoveWorker(handler)
+# h = w.submit('rotate', 90)
+# w.submit('rotate', -45)    # runs once the first move is done
+# h.wait()                   # just the first move (raises if it failed)
+# w.wait(timeout=5)          # everything queued so far
+# print(w.latency())
@@ -0,0 +1,130 @@
+# Shift register output daemon
+#
+# Instead of every motor process grabbing a shared lock on every step to
+# read-modify-write the combined outputs and shift them itself, a single
+# daemon process owns the Shifter. Each motor publishes its 4-bit coil
+# pattern into its own slot of a shared-memory array (one writer per
+# slot, so no lock is needed), and the daemon composes the slots into a
+# frame and latches it at a fixed rate.
+
+import time
+import multiprocessing
+
+# Indices into the shared stats array:
+TICKS, FRAMES, UPDATES, OVERWRITTEN, LATENCY_SUM, LATENCY_MAX, START, STOP = range(8)
+
+class OutputDaemon:
+    """
+    Owns a Shifter in its own process and latches the motor slots at
+    rate_hz. Motor k's nibble goes to bits 4k..4k+3 of the chain, the same
+    layout Stepper uses (so register k//2, low nibble for even k).
+
+    stats() reports:
+      frames / frame_rate  - frames actually latched (unchanged frames are
+                             skipped) and latches per second
+      tick_rate            - composition passes per second achieved
+      latency_avg/max_us   - time from publish() to the frame containing
+                             that update being latched
+      overwritten          - updates replaced by a newer one from the same
+                             motor before they were latched (i.e. a motor
+                             stepping faster than the frame rate)
+    """
+
+    def __init__(self, shifter, num_slots=None, rate_hz=2000):
+        if num_slots is None:
+            num_slots = 2*shifter.numRegisters
+        self.s = shifter
+        self.numSlots = num_slots
+        self.period = int(1e9/rate_hz)    # [ns]
+        # lock=False: each slot has exactly one writer (its motor)
+        self.slots = multiprocessing.Array('B', num_slots, lock=False)    # coil pattern per motor
+        self.seqs = multiprocessing.Array('I', num_slots, lock=False)     # publish count per motor
+        self.stamps = multiprocessing.Array('q', num_slots, lock=False)   # monotonic_ns() of last publish
+        self.stats_ = multiprocessing.Array('d', 8, lock=False)
+        self.running = multiprocessing.Value('b', 0, lock=False)
+        self.p = None
+
+    # Called from a motor process: set this motor's coil pattern.
+    def publish(self, slot, nibble):
+        self.slots[slot] = nibble
+        self.stamps[slot] = time.monotonic_ns()
+        self.seqs[slot] += 1
+
+    def start(self):
+        self.running.value = 1
+        self.p = multiprocessing.Process(target=self.__run, daemon=True)
+        self.p.start()
+
+    def stop(self):
+        self.running.value = 0
+        if self.p is not None:
+            self.p.join()
+            self.p = None
+
+    # The daemon loop: compose a frame from the slots every period and
+    # latch it if it changed.
+    def __run(self):
+        slots, seqs, stamps, st = self.slots, self.seqs, self.stamps, self.stats_
+        n = self.numSlots
+        nregs = self.s.numRegisters
+        frame = bytearray(nregs)
+        seen = [0]*n                      # publish count already latched, per slot
+        st[START] = time.monotonic_ns()
+        deadline = time.monotonic_ns()
+        while self.running.value:
+            pending = []
+            for k in range(n):
+                seq = seqs[k]
+                if seq != seen[k]:
+                    if seq - seen[k] > 1:
+                        st[OVERWRITTEN] += seq - seen[k] - 1
+                    seen[k] = seq
+                    pending.append(k)
+            if pending:
+                for r in range(nregs):
+                    lo = slots[2*r] if 2*r < n else 0
+                    hi = slots[2*r+1] if 2*r+1 < n else 0
+                    frame[r] = (lo & 0xF) | (hi & 0xF) << 4
+                if self.s.write(frame):
+                    st[FRAMES] += 1
+                now = time.monotonic_ns()
+                for k in pending:
+                    lat = now - stamps[k]
+                    st[LATENCY_SUM] += lat
+                    if lat > st[LATENCY_MAX]:
+                        st[LATENCY_MAX] = lat
+                st[UPDATES] += len(pending)
+            st[TICKS] += 1
+            deadline += self.period
+            wait = deadline - time.monotonic_ns()
+            if wait > 0:
+                time.sleep(wait/1e9)
+            else:
+                deadline = time.monotonic_ns()   # fell behind: don't try to catch up
+        st[STOP] = time.monotonic_ns()
+
+    def stats(self):
+        st = self.stats_
+        end = st[STOP] if not self.running.value and st[STOP] else time.monotonic_ns()
+        elapsed = max(end - st[START], 1)/1e9 if st[START] else 0
+        return {
+            'frames': int(st[FRAMES]),
+            'frame_rate': st[FRAMES]/elapsed if elapsed else 0.0,
+            'tick_rate': st[TICKS]/elapsed if elapsed else 0.0,
+            'updates': int(st[UPDATES]),
+            'overwritten': int(st[OVERWRITTEN]),
+            'latency_avg_us': st[LATENCY_SUM]/st[UPDATES]/1e3 if st[UPDATES] else 0.0,
+            'latency_max_us': st[LATENCY_MAX]/1e3,
+        }
+
+
+# Example:
+#
+# s = Shifter(data=16, latch=20, clock=21)
+# d = OutputDaemon(s, rate_hz=2000)
+# d.start()
+# m1 = Stepper(s, daemon=d)    # steps publish to the daemon, no lock
+# m2 = Stepper(s, daemon=d)
+# ...
+# d.stop()
+# print(d.stats())
@@ -0,0 +1,151 @@
+# Coordinated multi-axis motion planner
+#
+# Running each motor's moves in its own process means every step of
+# every motor is a separate shift of the whole chain, serialized by the
+# shared lock, and motors with different move lengths finish at different
+# times. MotionPlanner plans a move of all the motors on one Shifter at
+# once instead: the motor with the most steps sets the number of ticks,
+# the others spread their steps over those ticks Bresenham-style (like
+# drawing a line), and each tick shifts out one combined frame for all
+# the motors. Moves start and finish together, with one lock per tick
+# instead of one per motor step, and no per-motor processes.
+
+from step_timing import StepScheduler
+import motion_profile
+import trajectory
+
+class MotionPlanner:
+    """
+    Plans and runs coordinated moves for Steppers that share a Shifter
+    (all created on that Shifter, so their nibbles are in the same
+    frame, and share one lock). The motors' records in the class's
+    shared motor table (position, target, state, steps) and its
+    shifter_outputs are kept up to date, so single-motor
+    rotate()/goAngle() calls can be mixed with planned moves: a planned
+    move first waits for the moves already queued on its motors, and each
+    tick updates only the planned motors' bits of shifter_outputs and
+    shifts under the motors' lock, so other motors on the chain keep
+    stepping. Don't queue moves on the planned motors themselves while a
+    planned move is running.
+
+    Tick timing is the step delay of the longest axis (its drive mode's
+    delay), or with profile='trapezoid'/'scurve' the profile's interval
+    table for that axis (vmax/accel in deg/s and deg/s^2, as for
+    Stepper).
+    stats() gives the StepScheduler timing of the last move.
+    """
+
+    def __init__(self, shifter, motors, profile=None, vmax=None, accel=None):
+        if not motors:
+            raise ValueError('need at least one motor')
+        self.s = shifter
+        self.motors = list(motors)
+        self.cls = type(self.motors[0])      # Stepper class: shifter_outputs, vmax, ...
+        if profile is not None and profile not in motion_profile.PROFILES:
+            raise ValueError(f'unknown profile {profile!r} (expected one of {motion_profile.PROFILES})')
+        self.profile = profile
+        self.vmax = vmax if vmax is not None else self.cls.vmax
+        self.accel = accel if accel is not None else self.cls.accel
+        if self.vmax <= 0 or self.accel <= 0:
+            raise ValueError(f'vmax and accel must be positive, got {self.vmax} and {self.accel}')
+        if profile is not None:
+            for m in self.motors:      # any of them may be the longest axis
+                v0 = 1e6/m.delay/m.steps_per_degree
+                if self.vmax <= v0:
+                    raise ValueError(f'vmax {self.vmax} deg/s is not above the {v0:.1f} deg/s start speed, '
+                                     f'so the {profile} profile would never accelerate')
+        if len({id(m.lock) for m in self.motors}) > 1:
+            raise ValueError('the motors must share one lock')
+        self.lock = self.motors[0].lock
+        # the planned motors' bits of each register byte:
+        nr = shifter.numRegisters
+        mask = sum(0b1111 << m.shifter_bit_start for m in self.motors)
+        self.mask = mask.to_bytes(nr, 'little')
+        self.keep = bytes(0xFF & ~b for b in self.mask)
+        self.outputs = self.cls.shifter_outputs
+        self.view = memoryview(self.outputs)[:nr]
+        self.scheduler = StepScheduler()
+        self.frames = []
+        self.tick = 0
+
+    # Steps and direction for each motor's relative move (in the motor's
+    # own drive mode steps):
+    def __steps(self, deltas):
+        return [(int(m.steps_per_degree*abs(d)), 1 if d > 0 else -1) if d else (0, 0)
+                for m, d in zip(self.motors, deltas)]
+
+    # Combined frame for every tick of the move, worked out in one
+    # vectorized pass (trajectory.plan_axes). Motor i takes a step on the
+    # ticks where its error term (n_i added per tick) passes N, so its n_i
+    # steps are spread as evenly as possible over the N ticks.
+    def __plan(self, plan):
+        base = self.cls.shifter_outputs[:self.s.numRegisters]
+        return trajectory.plan_axes(self.motors, plan, base)
+
+    # Let the moves already queued on the motors finish, so the plan
+    # starts from where they really are:
+    def __settle(self):
+        for m in self.motors:
+            if hasattr(m, 'wait'):
+                m.wait()
+
+    # Move every motor by a relative angle (one per motor, in the order
+    # given to the planner; None or 0 leaves a motor alone), blocking
+    # until the move is done:
+    def rotate(self, deltas):
+        deltas = list(deltas)
+        if len(deltas) != len(self.motors):
+            raise ValueError(f'need one angle per motor ({len(self.motors)}), got {len(deltas)}')
+        self.__settle()
+        plan = self.__steps(deltas)
+        N = max(n for n, d in plan)
+        if N == 0:
+            return
+        self.frames, states = self.__plan(plan)
+        lead = self.motors[max(range(len(plan)), key=lambda i: plan[i][0])]   # longest axis
+        if self.profile is None:
+            intervals = lead.delay
+        else:
+            spd = lead.steps_per_degree
+            intervals = motion_profile.intervals(self.profile, N, self.vmax*spd,
+                                                 self.accel*spd, 1e6/lead.delay)
+        self.tick = 0
+        self.scheduler.run(N, intervals, self.__tick)
+        # Book-keeping for the Steppers (shifter_outputs is updated by every tick):
+        for m, st, (n, d) in zip(self.motors, states, plan):
+            row = m.row
+            row.state = st
+            row.position += d*n
+            row.steps += n
+            row.target += d*n            # queued single-motor moves plan from here
+
+    # Move every motor to an absolute angle by the shortest path (None
+    # leaves a motor alone):
+    def moveTo(self, targets):
+        self.__settle()
+        self.rotate([None if a is None else ((a - m.angle + 180) % 360) - 180
+                     for m, a in zip(self.motors, targets)])
+
+    # One shift per tick for all the motors; only their bits of the
+    # shared outputs change:
+    def __tick(self):
+        frame = self.frames[self.tick]
+        out, mask, keep = self.outputs, self.mask, self.keep
+        with self.lock:
+            for i in range(len(mask)):
+                out[i] = (out[i] & keep[i]) | (frame[i] & mask[i])
+            self.s.shiftBytes(self.view)
+        self.tick += 1
+
+    def stats(self):
+        return self.scheduler.stats()
+
+
+# Example:
+#
+# s = Shifter(data=16, latch=20, clock=21)
+# m1 = Stepper(s)
+# m2 = Stepper(s)
+# planner = MotionPlanner(s, [m1, m2], profile='trapezoid')
+# planner.moveTo([90, -45])     # both start and finish together
+# print(planner.stats())
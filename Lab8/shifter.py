@@ -1,34 +1,238 @@
 # Shift register class
 
-from RPi import GPIO
-from time import sleep
+import math
+import threading
+from collections import deque
+from gpio_backends import default_backend
+from time import sleep, perf_counter_ns, monotonic_ns
+
+# REVERSE[b] is byte b with its bit order flipped (used for MSB-first frames):
+REVERSE = bytes(int(f'{b:08b}'[::-1], 2) for b in range(256))
+
+
+class PulseTiming():
+    """
+    How long each edge on the data/clock/latch pins is held, from the
+    74HC595 datasheet minimums, instead of the old sleep(0) (a scheduler
+    yield on every clock pulse).
+
+    spec is (clock/latch pulse width, data setup, data hold, clock-to-latch
+    setup) in ns. Waiting max(pulse width, setup, latch setup) after every
+    pin write covers all of them; hold time is covered by the next write.
+
+    mode:
+      'none'      - no delay; each GPIO write already takes far longer than
+                    the part needs with RPi.GPIO (the default)
+      'spin'      - busy-wait a calibrated number of loop iterations
+      'nanosleep' - time.sleep() for the delay (may give up the CPU)
+      'yield'     - the old sleep(0) behaviour
+      'auto'      - calibrate() against the backend and pick 'none' if a
+                    single GPIO write is already long enough, else 'spin'
+    """
+
+    # NXP 74HC595 minimums [ns] at 25 C:
+    HC595_2V0 = (75, 75, 3, 75)    # VCC = 2.0 V, the safe column for 3.3 V logic
+    HC595_4V5 = (15, 15, 3, 15)    # VCC = 4.5 V
+    MODES = ('none', 'spin', 'nanosleep', 'yield', 'auto')
+
+    def __init__(self, mode='none', spec=HC595_2V0):
+        if mode not in PulseTiming.MODES:
+            raise ValueError(f'mode must be one of {PulseTiming.MODES}')
+        self.mode = mode
+        self.pulseWidth, self.setup, self.hold, self.latchSetup = spec
+        self.delayNs = max(self.pulseWidth, self.setup, self.latchSetup)
+        self.spinIters = None      # set by calibrate()
+        self.outputNs = None       # fastest GPIO write measured by calibrate()
+
+    # Measure how long one spin-loop iteration takes (and, given a GPIO
+    # output function and a pin that is safe to write, one GPIO write),
+    # then size the spin loop to the delay. In 'auto' mode this also
+    # picks the mode. Returns what was measured.
+    def calibrate(self, output=None, pin=None, samples=1000):
+        n = 100000
+        t0 = perf_counter_ns()
+        for i in range(n):
+            pass
+        iter_ns = (perf_counter_ns() - t0)/n
+        self.spinIters = max(1, math.ceil(self.delayNs/iter_ns))
+        if output is not None:
+            best = None
+            for i in range(samples):
+                t0 = perf_counter_ns()
+                output(pin, 0)
+                t = perf_counter_ns() - t0
+                best = t if best is None else min(best, t)
+            self.outputNs = best
+        if self.mode == 'auto':
+            self.mode = 'none' if self.outputNs is not None and self.outputNs >= self.delayNs else 'spin'
+        return {'spin_ns_per_iter': iter_ns, 'spin_iters': self.spinIters,
+                'output_ns': self.outputNs, 'delay_ns': self.delayNs, 'mode': self.mode}
+
+    # Return an output(pin, value) function that holds each write for the
+    # delay in this mode ('none' returns output itself, so costs nothing):
+    def wrap(self, output):
+        mode = self.mode
+        if mode == 'none':
+            return output
+        if mode in ('spin', 'auto'):
+            if self.spinIters is None:
+                self.calibrate()
+            spin = range(self.spinIters)
+            def timed(p, v):
+                output(p, v)
+                for i in spin:
+                    pass
+        elif mode == 'nanosleep':
+            delay = self.delayNs/1e9
+            def timed(p, v):
+                output(p, v)
+                sleep(delay)
+        else:                             # 'yield'
+            def timed(p, v):
+                output(p, v)
+                sleep(0)
+        return timed
 
 class Shifter():
 
-    def __init__(self, data, clock, latch):
+    # registers is the number of 74HC595s daisy-chained on the data pin.
+    # Whole-chain frames (shiftBytes) are exactly registers*8 bits long.
+    #
+    # bit_order ('lsb' or 'msb') selects which bit of each frame byte is
+    # clocked out first by shiftBytes(). Integer words (shiftWord) are
+    # always sent LSB first, as before.
+    #
+    # compiled=True precomputes the GPIO edges for every possible byte
+    # once (see __compile) so shifting is a table lookup per byte and the
+    # data pin is only written when its level actually has to change
+    # (plus once at the start of every shift: another process sharing the
+    # pins, e.g. a Stepper worker with its own copy of this Shifter, may
+    # have left it at either level).
+    #
+    # gpio is the backend used for the pins (see gpio_backends.py);
+    # defaults to RPi.GPIO.
+    #
+    # timing is a PulseTiming policy for how long each edge is held
+    # (default: no added delay).
+    def __init__(self, data, clock, latch, compiled=False, registers=1, bit_order='lsb', gpio=None,
+                 timing=None):
+        if bit_order not in ('lsb', 'msb'):
+            raise ValueError("bit_order must be 'lsb' or 'msb'")
+        self.gpio = gpio if gpio is not None else default_backend()
         self.dataPin = data
         self.latchPin = latch
         self.clockPin = clock
-        GPIO.setup(self.dataPin, GPIO.OUT)
-        GPIO.setup(self.latchPin, GPIO.OUT)
-        GPIO.setup(self.clockPin, GPIO.OUT)
+        self.numRegisters = registers
+        self.bitOrder = bit_order
+        # one call, so backends with line groups (GpiodGPIO) request all three together:
+        self.gpio.setup([self.dataPin, self.latchPin, self.clockPin], self.gpio.OUT)
+        self.setTiming(timing if timing is not None else PulseTiming())
+        self.lastWord = None         # (word, num_bits) of the last latch
+        self.shiftsIssued = 0        # latches actually sent
+        self.shiftsSuppressed = 0    # write() calls skipped as unchanged
+        self.compiled = compiled
+        if compiled:
+            self.table = self.__compile()
+
+    # Build the op tables for compiled mode. table[level][byte] holds
+    # the (pin, value) edges that clock out byte LSB first when the data
+    # pin is already at level, plus the level the data pin is left at.
+    # Two 256-entry tables, built once per Shifter.
+    def __compile(self):
+        table = ([], [])
+        for level in (0, 1):
+            for byte in range(256):
+                ops = []
+                cur = level
+                for i in range(8):
+                    bit = (byte >> i) & 1
+                    if bit != cur:                    # only write data on a change
+                        ops.append((self.dataPin, bit))
+                        cur = bit
+                    ops.append((self.clockPin, 1))
+                    ops.append((self.clockPin, 0))
+                table[level].append((tuple(ops), cur))
+        return table
+
+    # Compiled mode: clock out num_bits of word (plus zero padding up to
+    # a whole byte) by table lookup, without latching.
+    def __clockOut(self, word, num_bits):
+        output = self.output
+        data, clock = self.dataPin, self.clockPin
+        output(data, 0)                   # put the data pin in a known state
+        level = 0
+        for i in range(-num_bits % 8):
+            if level:
+                output(data, 0)
+                level = 0
+            output(clock, 1)
+            output(clock, 0)
+        table = self.table
+        for k in range(num_bits // 8):    # whole bytes, LSB first
+            ops, level = table[level][(word >> 8*k) & 0xFF]
+            for p, v in ops:
+                output(p, v)
+        for i in range(num_bits - num_bits % 8, num_bits):  # leftover bits
+            bit = (word >> i) & 1
+            if bit != level:
+                output(data, bit)
+                level = bit
+            output(clock, 1)
+            output(clock, 0)
+
+    # Compiled mode: clock out a whole-chain frame (already in LSB-first
+    # bit order) by table lookup, without latching.
+    def __clockOutBytes(self, frame):
+        output = self.output
+        output(self.dataPin, 0)           # known state, whoever shifted last
+        level = 0
+        table = self.table
+        for byte in frame:
+            ops, level = table[level][byte]
+            for p, v in ops:
+                output(p, v)
+
+    # Check a bytes/bytearray/memoryview frame is one byte per register
+    # and return it in LSB-first bit order:
+    def __frame(self, frame):
+        if len(frame) != self.numRegisters:
+            raise ValueError(f'frame must be {self.numRegisters} bytes, got {len(frame)}')
+        if isinstance(frame, memoryview) and frame.format != 'B':
+            frame = frame.cast('B')      # e.g. '<B' views of ctypes/multiprocessing arrays
+        if self.bitOrder == 'msb':
+            return bytes(frame).translate(REVERSE)
+        return frame
+
+    # Use a PulseTiming policy for all pin writes from now on:
+    def setTiming(self, timing):
+        if timing.mode == 'auto':
+            # data pin writes only matter on a clock edge, so this is safe
+            # (compiled mode sets the pin again at the start of every shift):
+            timing.calibrate(self.gpio.output, self.dataPin)
+        self.timing = timing
+        self.output = timing.wrap(self.gpio.output)
 
     def ping(self, p):  # ping the clock or latch pin
-        GPIO.output(p,1)
-        sleep(0)
-        GPIO.output(p,0)
+        self.output(p,1)
+        self.output(p,0)
 
     # Shift all bits in an arbitrary-length word, allowing
     # multiple 8-bit shift registers to be chained (with overflow
     # of SR_n tied to input of SR_n+1):
     def shiftWord(self, dataword, num_bits):
-        for i in range((num_bits+1) % 8):  # Load bits short of a byte with 0
+        self.lastWord = (dataword, num_bits)
+        self.shiftsIssued += 1
+        if self.compiled:
+            self.__clockOut(dataword, num_bits)
+            self.ping(self.latchPin)
+            return
+        for i in range(-num_bits % 8):     # Load bits short of a byte with 0
             # self.dataPin.value(0)  # MicroPython for ESP32
-            GPIO.output(self.dataPin, 0) 
+            self.output(self.dataPin, 0)
             self.ping(self.clockPin)
         for i in range(num_bits):          # Send the word
             # self.dataPin.value(dataword & (1<<i))  # MicroPython for ESP32
-            GPIO.output(self.dataPin, dataword & (1<<i))
+            self.output(self.dataPin, dataword & (1<<i))
             self.ping(self.clockPin)
         self.ping(self.latchPin)
 
@@ -36,6 +240,430 @@ class Shifter():
     def shiftByte(self, databyte):
         self.shiftWord(databyte, 8)
 
+    # Shift a whole-chain frame given as bytes, bytearray or memoryview,
+    # one byte per register. frame[0] is clocked out first, so it ends up
+    # in the register furthest down the chain -- the same place byte 0 of
+    # an integer word goes, i.e. shiftBytes(w.to_bytes(n, 'little')) ==
+    # shiftWord(w, 8*n). Exactly registers*8 bits are sent, with no pad.
+    def shiftBytes(self, frame):
+        frame = self.__frame(frame)
+        self.lastWord = (bytes(frame), None)
+        self.shiftsIssued += 1
+        if self.compiled:
+            self.__clockOutBytes(frame)
+        else:
+            output = self.output
+            data, clock = self.dataPin, self.clockPin
+            for byte in frame:
+                for i in range(8):
+                    output(data, byte & (1<<i))
+                    output(clock, 1)
+                    output(clock, 0)
+        self.ping(self.latchPin)
+
+    # Latch a word only if it differs from what the register already
+    # shows (e.g. calling stop() every loop iteration while idle).
+    # dataword may be an int or a bytes-like whole-chain frame.
+    # Returns True if the word was shifted, False if it was suppressed.
+    def write(self, dataword, num_bits=8):
+        if isinstance(dataword, int):
+            if self.lastWord == (dataword, num_bits):
+                self.shiftsSuppressed += 1
+                return False
+            self.shiftWord(dataword, num_bits)
+        else:
+            if self.lastWord is not None and self.lastWord[1] is None \
+                    and self.lastWord[0] == self.__frame(dataword):
+                self.shiftsSuppressed += 1
+                return False
+            self.shiftBytes(dataword)
+        return True
+
+    # Forget the last latched word so the next write() always shifts
+    # (e.g. after the register was cleared by something else):
+    def invalidate(self):
+        self.lastWord = None
+
+    # Stream a whole sequence of words (e.g. an entire move or LED
+    # animation) from one tight loop instead of one shiftWord() call
+    # per frame. The GPIO function and pins are looked up once, and the
+    # clock/latch pulses are inlined rather than going through ping().
+    # Frames may be ints (num_bits long, default the whole chain) or
+    # bytes-like whole-chain frames as for shiftBytes().
+    #
+    # If period_us is given, frames are latched on a fixed schedule
+    # (every period_us microseconds, measured from the first latch)
+    # instead of as fast as possible. Returns the number of frames sent.
+    def shiftFrames(self, frames, period_us=None, num_bits=None):
+        if num_bits is None:
+            num_bits = 8*self.numRegisters
+        compiled = self.compiled
+        output = self.output
+        data, clock, latch = self.dataPin, self.clockPin, self.latchPin
+        pad = range(-num_bits % 8)               # same padding as shiftWord()
+        masks = [1<<i for i in range(num_bits)]  # bit masks, computed once
+        byte_masks = masks[:8]
+        period = None if period_us is None else int(period_us*1000)  # [ns]
+        deadline = None
+        count = 0
+        last = None
+        for word in frames:
+            if not isinstance(word, int):        # whole-chain bytes frame
+                frame = self.__frame(word)
+                last = (bytes(frame), None)
+                if compiled:
+                    self.__clockOutBytes(frame)
+                else:
+                    for byte in frame:
+                        for m in byte_masks:
+                            output(data, byte & m)
+                            output(clock, 1)
+                            output(clock, 0)
+            else:
+                last = (word, num_bits)
+                if compiled:
+                    self.__clockOut(word, num_bits)
+                else:
+                    for i in pad:
+                        output(data, 0)
+                        output(clock, 1)
+                        output(clock, 0)
+                    for m in masks:
+                        output(data, word & m)
+                        output(clock, 1)
+                        output(clock, 0)
+            if period is not None:
+                if deadline is None:
+                    deadline = perf_counter_ns()   # first frame sets the schedule
+                else:
+                    deadline += period
+                    wait = deadline - perf_counter_ns()
+                    if wait > 2000000:             # sleep off most of a long wait...
+                        sleep((wait - 1000000)/1e9)
+                    while perf_counter_ns() < deadline:  # ...then spin to the deadline
+                        pass
+            output(latch, 1)
+            output(latch, 0)
+            count += 1
+        if count:
+            self.lastWord = last
+        self.shiftsIssued += count
+        return count
+
+
+
+class ParallelShifter():
+    """
+    Several independent register chains sharing one clock pin and one
+    latch pin, each with its own data pin. Every clock cycle sets all K
+    data pins with one bulk write (output() with a list of pins, or a
+    single set/clear store pair on MmapGPIO), so K chains update in the
+    time of one instead of K Shifters one after another.
+
+    Each chain is registers long; frames/words are given one per chain,
+    in data_pins order, with the same layout as Shifter.shiftBytes() /
+    Shifter.shiftWord().
+    """
+
+    def __init__(self, data_pins, clock, latch, registers=1, gpio=None, timing=None):
+        self.gpio = gpio if gpio is not None else default_backend()
+        self.dataPins = list(data_pins)
+        self.clockPin = clock
+        self.latchPin = latch
+        self.numRegisters = registers
+        self.gpio.setup(self.dataPins, self.gpio.OUT)     # one line group where supported
+        self.gpio.setup([self.clockPin, self.latchPin], self.gpio.OUT)
+        self.timing = timing if timing is not None else PulseTiming()
+        if self.timing.mode == 'auto':
+            self.timing.calibrate(self.gpio.output, self.clockPin)
+        self.output = self.timing.wrap(self.gpio.output)
+        # On the register backend, write the data pins as one set mask and
+        # one clear mask per clock cycle:
+        if hasattr(self.gpio, 'setClear') and all(p < 32 for p in self.dataPins):
+            self.pinMasks = [1 << p for p in self.dataPins]
+            self.allMask = sum(self.pinMasks)
+            self.writeData = self.timing.wrap(self.gpio.setClear)
+        else:
+            self.pinMasks = None
+        self.shiftsIssued = 0
+
+    def ping(self, p):  # ping the clock or latch pin
+        self.output(p,1)
+        self.output(p,0)
+
+    # Clock out one bit-column per cycle; columns[j] is the j-th bit of
+    # every chain, as a list of 0/1 in data_pins order:
+    def __clockColumns(self, columns):
+        output = self.output
+        clock = self.clockPin
+        if self.pinMasks is not None:
+            masks = self.pinMasks
+            allMask = self.allMask
+            writeData = self.writeData
+            for col in columns:
+                setm = 0
+                for m, b in zip(masks, col):
+                    if b:
+                        setm |= m
+                writeData(setm, allMask & ~setm)
+                output(clock, 1)
+                output(clock, 0)
+        else:
+            datas = self.dataPins
+            for col in columns:
+                output(datas, col)
+                output(clock, 1)
+                output(clock, 0)
+        self.ping(self.latchPin)
+        self.shiftsIssued += 1
+
+    # One whole-chain frame (bytes-like, registers long) per chain:
+    def shiftBytes(self, frames):
+        if len(frames) != len(self.dataPins):
+            raise ValueError(f'need one frame per chain ({len(self.dataPins)}), got {len(frames)}')
+        n = self.numRegisters
+        for f in frames:
+            if len(f) != n:
+                raise ValueError(f'each frame must be {n} bytes, got {len(f)}')
+        frames = [bytes(f) for f in frames]
+        self.__clockColumns([[(f[k] >> i) & 1 for f in frames] for k in range(n) for i in range(8)])
+
+    # One int word per chain, num_bits each (default the whole chain),
+    # zero padded to whole bytes like Shifter.shiftWord():
+    def shiftWords(self, words, num_bits=None):
+        if len(words) != len(self.dataPins):
+            raise ValueError(f'need one word per chain ({len(self.dataPins)}), got {len(words)}')
+        if num_bits is None:
+            num_bits = 8*self.numRegisters
+        pad = -num_bits % 8
+        columns = [[0]*len(words) for i in range(pad)]
+        columns += [[(w >> i) & 1 for w in words] for i in range(num_bits)]
+        self.__clockColumns(columns)
+
+
+class SpiShifter():
+    """
+    Same shiftByte()/shiftWord() API as Shifter, but the frame goes out as
+    one transfer on the Pi's SPI peripheral instead of bit-banging the data
+    and clock pins. Wire the register's data input to MOSI (GPIO 10) and
+    its clock to SCLK (GPIO 11); the latch stays on an ordinary GPIO pin
+    and is pulsed once per frame.
+
+    spi is any spidev.SpiDev-like object (see FileSpiDev in
+    gpio_backends.py for a stand-in that captures transfers); by default
+    /dev/spidev<bus>.<device> is opened with the spidev module.
+    """
+
+    def __init__(self, latch, registers=1, bit_order='lsb', spi=None, bus=0, device=0,
+                 speed_hz=8000000, gpio=None):
+        if bit_order not in ('lsb', 'msb'):
+            raise ValueError("bit_order must be 'lsb' or 'msb'")
+        self.gpio = gpio if gpio is not None else default_backend()
+        if spi is None:
+            import spidev
+            spi = spidev.SpiDev()
+        spi.open(bus, device)
+        spi.max_speed_hz = speed_hz
+        spi.mode = 0                 # data sampled on the rising clock edge
+        self.spi = spi
+        # writebytes2() takes any buffer and splits large frames itself:
+        self.transfer = getattr(spi, 'writebytes2', None) or (lambda b: spi.writebytes(list(b)))
+        self.latchPin = latch
+        self.numRegisters = registers
+        self.bitOrder = bit_order
+        self.gpio.setup(self.latchPin, self.gpio.OUT)
+        self.lastWord = None
+        self.shiftsIssued = 0
+        self.shiftsSuppressed = 0
+
+    def ping(self, p):  # ping the latch pin
+        self.gpio.output(p,1)
+        self.gpio.output(p,0)
+
+    # SPI sends each byte MSB first, so LSB-first data is bit-reversed
+    # byte by byte (one bytes.translate() per frame):
+    def __spiBytes(self, frame):
+        if self.bitOrder == 'lsb':
+            return bytes(frame).translate(REVERSE)
+        return frame
+
+    # Same result on the outputs as Shifter.shiftWord(): the word is zero
+    # padded up to whole bytes, padding first.
+    def shiftWord(self, dataword, num_bits):
+        self.lastWord = (dataword, num_bits)
+        self.shiftsIssued += 1
+        pad = -num_bits % 8
+        frame = ((dataword & ((1<<num_bits) - 1)) << pad).to_bytes((num_bits + pad)//8, 'little')
+        self.transfer(frame.translate(REVERSE))
+        self.ping(self.latchPin)
+
+    def shiftByte(self, databyte):
+        self.shiftWord(databyte, 8)
+
+    # Whole-chain frame, same layout as Shifter.shiftBytes():
+    def shiftBytes(self, frame):
+        if len(frame) != self.numRegisters:
+            raise ValueError(f'frame must be {self.numRegisters} bytes, got {len(frame)}')
+        self.lastWord = (bytes(frame), None)
+        self.shiftsIssued += 1
+        self.transfer(self.__spiBytes(frame))
+        self.ping(self.latchPin)
+
+    # Only shift if the word differs from the last one latched:
+    def write(self, dataword, num_bits=8):
+        key = (dataword, num_bits) if isinstance(dataword, int) else (bytes(dataword), None)
+        if self.lastWord == key:
+            self.shiftsSuppressed += 1
+            return False
+        if key[1] is None:
+            self.shiftBytes(dataword)
+        else:
+            self.shiftWord(dataword, num_bits)
+        return True
+
+    def invalidate(self):
+        self.lastWord = None
+
+    # One transfer + latch per frame; see Shifter.shiftFrames().
+    def shiftFrames(self, frames, period_us=None, num_bits=None):
+        if num_bits is None:
+            num_bits = 8*self.numRegisters
+        period = None if period_us is None else int(period_us*1000)  # [ns]
+        deadline = None
+        count = 0
+        for word in frames:
+            if isinstance(word, int):
+                self.shiftWord(word, num_bits)
+            else:
+                self.shiftBytes(word)
+            count += 1
+            if period is not None:
+                deadline = perf_counter_ns() + period if deadline is None else deadline + period
+                wait = deadline - perf_counter_ns()
+                if wait > 2000000:
+                    sleep((wait - 1000000)/1e9)
+                while perf_counter_ns() < deadline:
+                    pass
+        return count
+
+
+class InputShifter():
+    """
+    Reads N daisy-chained 74HC165 parallel-in/serial-out registers (e.g. a
+    panel of switches) as one snapshot: one parallel load, then 8*N clock
+    pulses on the Pi's three pins, however many inputs there are.
+
+    Wiring: SH/LD to load, CLK to clock, QH of the register nearest the Pi
+    to data, and each register's SER to the QH of the next one. Tie
+    CLK INH low.
+
+    Snapshots are one byte per register, frame[0] being the register
+    nearest the Pi, with input A in bit 0 through H in bit 7; read()
+    returns the same as an int (input i of the chain is bit i).
+
+    startSampler() reads the chain at a fixed rate in a background thread
+    and turns changes into (timestamp_ns, input, level) edge events,
+    collected by events() or passed to a callback.
+    """
+
+    def __init__(self, data, clock, load, registers=1, gpio=None, timing=None):
+        self.gpio = gpio if gpio is not None else default_backend()
+        self.dataPin = data
+        self.clockPin = clock
+        self.loadPin = load
+        self.numRegisters = registers
+        self.gpio.setup(self.dataPin, self.gpio.IN)
+        self.gpio.setup(self.clockPin, self.gpio.OUT, initial=0)
+        self.gpio.setup(self.loadPin, self.gpio.OUT, initial=1)    # SH/LD idles high (shift)
+        timing = timing if timing is not None else PulseTiming()
+        if timing.mode == 'auto':
+            timing.calibrate(self.gpio.output, self.clockPin)
+        self.output = timing.wrap(self.gpio.output)
+        self.last = None                  # last sampled snapshot (int)
+        self.queue = deque()              # pending edge events from the sampler
+        self.samples = 0
+        self.overruns = 0                 # sampler periods that were missed
+        self.thread = None
+        self.running = False
+
+    # Parallel-load the inputs and clock them all in:
+    def readBytes(self):
+        output, input_ = self.output, self.gpio.input
+        data, clock, load = self.dataPin, self.clockPin, self.loadPin
+        output(load, 0)                   # latch all inputs into the registers
+        output(load, 1)
+        frame = bytearray(self.numRegisters)
+        for k in range(self.numRegisters):
+            byte = 0
+            for i in range(8):            # QH comes out first: H, G, ..., A
+                byte = (byte << 1) | (1 if input_(data) else 0)
+                output(clock, 1)
+                output(clock, 0)
+            frame[k] = byte
+        return bytes(frame)
+
+    def read(self):
+        return int.from_bytes(self.readBytes(), 'little')
+
+    # Edge events between two snapshots, as (input, new level):
+    def changes(self, old, new):
+        diff = old ^ new
+        out = []
+        while diff:
+            low = diff & -diff
+            i = low.bit_length() - 1
+            out.append((i, 1 if new & low else 0))
+            diff ^= low
+        return out
+
+    # Take one sample and queue/return its edge events:
+    def sample(self):
+        now = monotonic_ns()
+        snap = self.read()
+        self.samples += 1
+        events = []
+        if self.last is not None and snap != self.last:
+            events = [(now, i, level) for i, level in self.changes(self.last, snap)]
+            self.queue.extend(events)
+        self.last = snap
+        return events
+
+    # Sample rate_hz times a second in a background thread. callback, if
+    # given, is called with each non-empty list of events (from that thread).
+    def startSampler(self, rate_hz=1000, callback=None):
+        if self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, args=(rate_hz, callback), daemon=True)
+        self.thread.start()
+
+    def stopSampler(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __run(self, rate_hz, callback):
+        period = int(1e9/rate_hz)
+        deadline = monotonic_ns()
+        while self.running:
+            events = self.sample()
+            if events and callback is not None:
+                callback(events)
+            deadline += period
+            wait = deadline - monotonic_ns()
+            if wait > 0:
+                sleep(wait/1e9)
+            else:
+                self.overruns += 1
+                deadline = monotonic_ns()
+
+    # Pending edge events, oldest first (and clear them):
+    def events(self):
+        out = []
+        while self.queue:
+            out.append(self.queue.popleft())
+        return out
 
 # Example:
 #
@@ -44,3 +672,48 @@ class Shifter():
 # for i in range(256):
 #     s.shiftByte(i)
 #     sleep(0.1)
+#
+# or, with precompiled op tables (fewer GPIO writes per byte):
+#
+# s = Shifter(data=16,clock=20,latch=21,compiled=True)
+#
+# or, to only shift when the displayed byte actually changes:
+#
+# s.write(0)     # shifted
+# s.write(0)     # suppressed (s.shiftsSuppressed == 1)
+#
+# or, for a chain of 4 registers fed from a bytearray:
+#
+# s = Shifter(data=16,clock=20,latch=21,registers=4)
+# frame = bytearray(4)
+# frame[2] = 0b10000001
+# s.shiftBytes(frame)
+#
+# or, off the Pi, against the simulated backend from gpio_backends.py:
+#
+# s = Shifter(data=16,clock=20,latch=21,gpio=SimGPIO())
+#
+# or, over the SPI peripheral (data on MOSI=10, clock on SCLK=11):
+#
+# s = SpiShifter(latch=21)
+#
+# or, holding each edge for the datasheet minimum with a calibrated spin:
+#
+# s = Shifter(data=16,clock=20,latch=21,timing=PulseTiming('spin'))
+#
+# or, reading a panel of 24 switches on three 74HC165s:
+#
+# ins = InputShifter(data=5, clock=6, load=13, registers=3)
+# print(bin(ins.read()))
+# ins.startSampler(rate_hz=500)
+# ...
+# for t, switch, level in ins.events(): print(switch, 'on' if level else 'off')
+#
+# or, updating three separate chains at once on a shared clock and latch:
+#
+# p = ParallelShifter(data_pins=[16,19,26], clock=20, latch=21)
+# p.shiftWords([0x0F, 0xF0, 0xAA])
+#
+# or, to stream the same animation with one call:
+#
+# s.shiftFrames(range(256), period_us=100000)
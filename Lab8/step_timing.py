@@ -0,0 +1,119 @@
+# Absolute-deadline step scheduling
+#
+# Sleeping a fixed delay after every step lets the time spent shifting,
+# waiting for the lock and oversleeping add up, so each step comes a bit
+# late and the whole move runs long. StepScheduler times step k of a move
+# against start + k*period on time.monotonic_ns() instead: a late step
+# only shortens the waits after it, so the error doesn't build up over the
+# move.
+
+import time
+import multiprocessing
+
+# Shortest time between two steps [us], even when catching up (about one
+# shift of the chain on a Pi Zero; trajectory.validate() holds planned
+# moves to it too):
+MIN_INTERVAL_US = 100
+
+# Histogram bin upper edges [us]; one more bin catches everything above.
+BINS_US = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Indices into the shared counters:
+STEPS, OVERRUNS, RESYNCS, MAX_LATE, START, END, PLANNED = range(7)
+
+def _bin(ns):
+    us = ns/1e3
+    for i, edge in enumerate(BINS_US):
+        if us < edge:
+            return i
+    return len(BINS_US)
+
+def _labels():
+    return [f'<{e}' for e in BINS_US] + [f'>={BINS_US[-1]}']
+
+class StepScheduler:
+    """
+    Runs the steps of one move on absolute deadlines. Steps that come
+    late are caught up gradually: the waits after them are shortened,
+    but never to less than catch_up times the planned interval (nor
+    MIN_INTERVAL_US), so the motor never sees a burst of steps faster
+    than it was planned for by more than 1/catch_up. max_lag limits the
+    drift: once the move is more than max_lag periods behind, the
+    schedule restarts from the current time (a resync) and the lag is
+    dropped instead of caught up.
+
+    The stats of the last move are kept in shared memory, so they can be
+    read with stats() after a move that ran in another process:
+      jitter_us   - histogram of how late each step came vs. its deadline
+      overrun_us  - histogram of how far past the next deadline each
+                    step's work (shift, lock wait, ...) ran
+      drift_us    - actual minus planned duration of the move
+    """
+
+    def __init__(self, max_lag=4, catch_up=0.8):
+        self.maxLag = max_lag
+        self.catchUp = catch_up
+        self.jitter = multiprocessing.Array('q', len(BINS_US) + 1, lock=False)
+        self.overrun = multiprocessing.Array('q', len(BINS_US) + 1, lock=False)
+        self.counts = multiprocessing.Array('q', 7, lock=False)
+
+    # Call step() num_steps times, one every period_us, or with the wait
+    # after step k given by period_us[k] (a motion profile's interval
+    # table):
+    def run(self, num_steps, period_us, step):
+        if isinstance(period_us, (int, float)):
+            periods = [int(period_us*1000)]*num_steps    # [ns]
+        else:
+            periods = [int(p*1000) for p in period_us[:num_steps]]
+        jitter, overrun, c = self.jitter, self.overrun, self.counts
+        jitter[:] = [0]*len(jitter)
+        overrun[:] = [0]*len(overrun)
+        c[:] = [0]*len(c)
+        c[PLANNED] = sum(periods)
+        floor = MIN_INTERVAL_US*1000
+        deadline = c[START] = time.monotonic_ns()
+        for period in periods:
+            stepped = time.monotonic_ns()
+            late = max(stepped - deadline, 0)
+            jitter[_bin(late)] += 1
+            if late > c[MAX_LATE]:
+                c[MAX_LATE] = late
+            step()
+            c[STEPS] += 1
+            deadline += period
+            now = time.monotonic_ns()
+            behind = now - deadline
+            if behind >= 0:
+                c[OVERRUNS] += 1
+                overrun[_bin(behind)] += 1
+                if behind > self.maxLag*period:
+                    c[RESYNCS] += 1
+                    deadline = now     # too far behind: drop the lag
+            # catching up or not, the next step is never too close to this one:
+            due = max(deadline, stepped + max(int(period*self.catchUp), floor))
+            wait = due - time.monotonic_ns()
+            if wait > 0:
+                time.sleep(wait/1e9)
+        c[END] = time.monotonic_ns()
+
+    def stats(self):
+        c = self.counts
+        actual = (c[END] or time.monotonic_ns()) - c[START] if c[START] else 0
+        return {
+            'steps': c[STEPS],
+            'planned_ms': round(c[PLANNED]/1e6, 3),
+            'actual_ms': round(actual/1e6, 3),
+            'drift_us': round((actual - c[PLANNED])/1e3, 1) if c[END] else 0.0,
+            'max_late_us': round(c[MAX_LATE]/1e3, 1),
+            'overruns': c[OVERRUNS],
+            'resyncs': c[RESYNCS],
+            'jitter_us': dict(zip(_labels(), self.jitter[:])),
+            'overrun_us': dict(zip(_labels(), self.overrun[:])),
+        }
+
+
+# Example:
+#
+# sched = StepScheduler(max_lag=4, catch_up=0.8)
+# sched.run(512, 1200, lambda: motor_step(+1))   # 512 steps, 1200 us apart
+# print(sched.stats())
@@ -0,0 +1,226 @@
+# Binary step-trace recorder
+#
+# When a motor misbehaves in the field, the only way to see what the step
+# code actually sent (and when) is to record it. StepRecorder appends a
+# fixed-size record per step to a preallocated, memory-mapped log file:
+# no formatting, no system call and no lock on the step path, just one
+# struct.pack_into() (and a copy of the frame) into the shared mapping.
+# Every motor has its own ring in the file, written only by the process
+# that steps that motor, so writers never contend; each ring always holds
+# that motor's latest capacity steps.
+#
+# Then, off the Pi or on it:
+#   python3 step_trace.py stats LOG            step-interval statistics per
+#                                              motor (NumPy, straight from
+#                                              the mmap)
+#   python3 step_trace.py replay LOG [--sim] [--registers N] [--speed X]
+#                                              shift the recorded frames
+#                                              out again on their original
+#                                              timing (--sim: simulated GPIO)
+#
+# File layout (little-endian):
+#   header   magic 'STPTRC2\0', version u32, record size u32,
+#            capacity per motor u64, motors u32, pad u32    (32 bytes)
+#   counts   motors x records written u64
+#   rings    motors x capacity x (timestamp_ns i64, shifter word u64,
+#            motor u8, coil pattern u8, flags u8, 5 pad bytes) (24 bytes)
+
+import os
+import sys
+import mmap
+import time
+import heapq
+import struct
+
+MAGIC = b'STPTRC2\0'
+VERSION = 2
+HEADER = struct.Struct('<8sIIQI4x')
+RECORD = struct.Struct('<qQBBB5x')
+WORD_OFFSET = 8                   # shifter word within a record
+COUNT = struct.Struct('<Q')
+
+WORD = 0x01                       # flags: shifter word is valid (not an OutputDaemon step)
+
+# Offsets of motor's records-written count and of its ring:
+def _count_offset(motor):
+    return HEADER.size + COUNT.size*motor
+
+def _ring_offset(motors, capacity, motor):
+    return HEADER.size + COUNT.size*motors + capacity*RECORD.size*motor
+
+class StepRecorder:
+    """
+    Step log of capacity records for each of motors motors (ids 0 to
+    motors-1) in the file at path (created or truncated). Create it
+    before the motors' worker processes start: the mapping is shared
+    with them. Each motor's steps must all be recorded from one process
+    (its worker), which is what lets record() do without a lock.
+
+    record(motor, pattern, frame) logs one step: the motor id, its new
+    coil pattern, and the whole-chain frame that was shifted out (a
+    bytes-like object of up to 8 bytes, frame[0] = lowest byte of the
+    word, e.g. a memoryview of the shared outputs, copied as is), or
+    frame=None if the motor only published its pattern (OutputDaemon).
+    """
+
+    def __init__(self, path, capacity=1 << 17, motors=2):   # 6 MB, ~2.5 min of each motor at full rate
+        self.path = path
+        self.capacity = capacity
+        self.motors = motors
+        size = _ring_offset(motors, capacity, motors)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self.mm = mmap.mmap(fd, size)      # MAP_SHARED: one log for every process
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self.mm, 0, MAGIC, VERSION, RECORD.size, capacity, motors)
+        # every motor's count as one 'Q' array over the header, so the
+        # step path reads and bumps it without unpacking:
+        self.counts = memoryview(self.mm)[HEADER.size:_count_offset(motors)].cast('Q')
+
+    def record(self, motor, pattern, frame=None):
+        t = time.monotonic_ns()
+        n = self.counts[motor]
+        off = _ring_offset(self.motors, self.capacity, motor) + (n % self.capacity)*RECORD.size
+        mm = self.mm
+        RECORD.pack_into(mm, off, t, 0, motor, pattern, 0 if frame is None else WORD)
+        if frame is not None:
+            off += WORD_OFFSET
+            mm[off:off + len(frame)] = frame  # rest of the word was zeroed above
+        self.counts[motor] = n + 1            # after the record, for live readers
+
+    def count(self):
+        return sum(self.counts)
+
+    def close(self):
+        self.counts.release()                 # the mapping can't close with a view open
+        self.mm.flush()
+        self.mm.close()
+
+
+# Map a log read-only; returns (mmap, capacity per motor, records written
+# per motor):
+def open_trace(path):
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, rsize, capacity, motors = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or rsize != RECORD.size:
+        mm.close()
+        raise ValueError(f'{path} is not a version {VERSION} step trace')
+    counts = [COUNT.unpack_from(mm, _count_offset(m))[0] for m in range(motors)]
+    return mm, capacity, counts
+
+# Record indices of one ring oldest first (it may have wrapped):
+def _order(capacity, count):
+    if count <= capacity:
+        return range(count)
+    start = count % capacity
+    return list(range(start, capacity)) + list(range(start))
+
+# One motor's records oldest first:
+def _ring(mm, capacity, counts, motor):
+    base = _ring_offset(len(counts), capacity, motor)
+    for i in _order(capacity, counts[motor]):
+        yield RECORD.unpack_from(mm, base + i*RECORD.size)
+
+# (timestamp_ns, word, motor, pattern, flags) for every record, oldest
+# first across all the motors:
+def records(path):
+    mm, capacity, counts = open_trace(path)
+    try:
+        yield from heapq.merge(*(_ring(mm, capacity, counts, m) for m in range(len(counts))),
+                               key=lambda r: r[0])
+    finally:
+        mm.close()
+
+# Shift the recorded steps out through shifter again, on the recorded
+# timing (speed > 1 replays faster). Steps recorded without a shifter word
+# (OutputDaemon) are put back into the frame by motor nibble, as the
+# daemon would.
+def replay(path, shifter, speed=1.0):
+    n = shifter.numRegisters
+    frame = bytearray(n)
+    t0 = start = None
+    steps = 0
+    for t, word, motor, pattern, flags in records(path):
+        if flags & WORD:
+            frame[:] = (word & ((1 << 8*n) - 1)).to_bytes(n, 'little')
+        else:
+            i, shift = divmod(4*motor, 8)
+            if i < n:
+                frame[i] = (frame[i] & ~(0b1111 << shift)) | (pattern << shift)
+        if t0 is None:
+            t0, start = t, time.monotonic_ns()
+        wait = start + (t - t0)/speed - time.monotonic_ns()
+        if wait > 0:
+            time.sleep(wait/1e9)
+        shifter.shiftBytes(frame)
+        steps += 1
+    return steps
+
+# Step-interval statistics per motor, computed with NumPy on zero-copy
+# views of the mapped rings:
+def stats(path):
+    import numpy as np    # only needed for analysis, not on the step path
+    mm, capacity, counts = open_trace(path)
+    dtype = np.dtype([('t', '<i8'), ('word', '<u8'), ('motor', 'u1'),
+                      ('pattern', 'u1'), ('flags', 'u1'), ('pad', 'V5')])
+    out = {'records': int(sum(counts)), 'kept': 0, 'motors': {}}
+    for m, count in enumerate(counts):
+        if not count:
+            continue
+        recs = np.frombuffer(mm, dtype=dtype, count=min(count, capacity),
+                             offset=_ring_offset(len(counts), capacity, m))
+        if count > capacity:                   # wrapped: oldest first
+            recs = np.concatenate((recs[count % capacity:], recs[:count % capacity]))
+        out['kept'] += int(len(recs))
+        t = recs['t']
+        d = np.diff(t)/1e3                     # [us]
+        entry = {'steps': int(len(t))}
+        if len(d):
+            p50, p90, p99 = np.percentile(d, (50, 90, 99))
+            entry.update({
+                'interval_us': {
+                    'mean': round(float(d.mean()), 1),
+                    'std': round(float(d.std()), 1),
+                    'min': round(float(d.min()), 1),
+                    'p50': round(float(p50), 1),
+                    'p90': round(float(p90), 1),
+                    'p99': round(float(p99), 1),
+                    'max': round(float(d.max()), 1),
+                },
+                'steps_per_s': round(float(1e6*len(d)/d.sum()), 1) if d.sum() else 0.0,
+            })
+        out['motors'][m] = entry
+        del recs, t                            # release the views before unmapping
+    mm.close()
+    return out
+
+if __name__ == '__main__':
+    import json
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ('stats', 'replay'):
+        print('usage: step_trace.py stats LOG | replay LOG [--sim] [--registers N] [--speed X]')
+        sys.exit(2)
+    cmd, path = args[0], args[1]
+    if cmd == 'stats':
+        try:
+            print(json.dumps(stats(path), indent=2))
+        except ImportError:
+            print('stats needs NumPy (pip install numpy)')
+            sys.exit(1)
+    else:
+        from gpio_backends import default_backend, SimGPIO
+        from shifter import Shifter
+        registers = int(args[args.index('--registers') + 1]) if '--registers' in args else 1
+        speed = float(args[args.index('--speed') + 1]) if '--speed' in args else 1.0
+        GPIO = SimGPIO() if '--sim' in args else default_backend()
+        try:
+            GPIO.setmode(GPIO.BCM)
+            s = Shifter(data=16, latch=20, clock=21, registers=registers, gpio=GPIO)
+            print(f'replayed {replay(path, s, speed)} steps')
+        except KeyboardInterrupt:
+            print('\nStopping...')
+        finally:
+            GPIO.cleanup()
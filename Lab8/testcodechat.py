@@ -9,6 +9,7 @@
 import time
 import multiprocessing
 from Lab8.Orignials.shifterOriginal import Shifter   # our custom Shifter class
+from Lab8.move_worker import MoveWorker
 
 class Stepper:
     """
@@ -41,10 +42,12 @@ class Stepper:
 
     def __init__(self, shifter, lock):
         self.s = shifter          # shift register
-        self.angle = 0.0          # current output shaft angle
+        self.angle = 0.0          # current output shaft angle (kept by the worker)
+        self.target = 0.0         # where the last queued move will end
         self.step_state = 0       # track position in sequence
         self.start_bit = 4 * Stepper.num_steppers  # starting bit position
         self.lock = lock          # multiprocessing lock
+        self.worker = MoveWorker(self.__command)  # one process runs all our moves, in order
         Stepper.num_steppers += 1 # increment the instance count
 
     # Signum function:
@@ -75,27 +78,40 @@ class Stepper:
         self.angle = (self.angle + direction / Stepper.steps_per_degree) % 360
         time.sleep(Stepper.delay / 1e5)
 
-    # Move relative angle from current position:
-    def __rotate(self, delta):
-        direction = self.__sgn(delta)
-        steps = int(abs(delta) * Stepper.steps_per_degree)
+    # Take a signed number of steps:
+    def __rotate(self, count):
+        direction = self.__sgn(count)
+        steps = abs(count)
+        if steps:
+            self.worker.started()   # dispatch-to-first-step latency
         for _ in range(steps):
             self.__step(direction)
 
-    # Move relative angle from current position:
+    # Run one queued move in the worker:
+    def __command(self, cmd, steps):
+        self.__rotate(steps)
+
+    # Move relative angle from the end of the last queued move. Returns a
+    # MoveHandle right away (handle.wait(timeout) / handle.done()):
     def rotate(self, delta):
-        time.sleep(0.1)
-        p = multiprocessing.Process(target=self.__rotate, args=(delta,))
-        p.start()
+        steps = int(abs(delta) * Stepper.steps_per_degree) * self.__sgn(delta)
+        self.target = (self.target + steps / Stepper.steps_per_degree) % 360
+        return self.worker.submit('steps', steps)
 
-    # Move to an absolute angle taking the shortest possible path:
+    # Move to an absolute angle taking the shortest possible path
+    # (planned from where the moves already queued will end):
     def goAngle(self, target):
-        diff = ((target - self.angle + 180) % 360) - 180
-        self.rotate(diff)
+        diff = ((target - self.target + 180) % 360) - 180
+        return self.rotate(diff)
+
+    # Block until all queued moves are done (or timeout [s]):
+    def wait(self, timeout=None):
+        return self.worker.wait(timeout)
 
      # Set the motor zero point
     def zero(self):
         self.angle = 0.0
+        self.target = 0.0
 
 
 # ---- Example use ----
@@ -0,0 +1,148 @@
+# Vectorized move precomputation
+#
+# Instead of working out each step's coil pattern, register bits and
+# position inside the timed step loop, a whole move is computed up front
+# as arrays in one vectorized pass, and the step loop only indexes them.
+# Having the whole move as data also means it can be checked (validate())
+# before the motor turns at all.
+#
+# Only what the step loop reads is computed: the other motors' nibbles
+# change while a move runs, so whole-chain frames can't be worked out
+# ahead for a single motor (MotionPlanner, which owns every motor on the
+# chain, does that with plan_axes()).
+#
+# NumPy does the vectorized pass when it is installed (pip install
+# numpy); without it the same tables are built with plain Python, so the
+# Steppers work either way. The step loop always indexes plain lists.
+
+from step_timing import MIN_INTERVAL_US   # no step interval shorter than this
+
+try:
+    import numpy as np
+except ImportError:      # optional: only makes planning faster
+    np = None
+
+class Trajectory:
+    """
+    One motor's move of steps (signed) from sequence state state0 and
+    position position0, as per-step lists (entry k is step k+1):
+
+      states     index into the coil sequence after the step
+      patterns   coil pattern (seq[state])
+      nibbles    pattern shifted to the motor's bits of its register byte
+      positions  position after the step [steps from zero]
+
+    intervals_us is the wait after each step [us] (one number for all of
+    them, or a motion profile's table); the motor's nibble starts at bit
+    bit_start of a num_registers-byte chain.
+    """
+
+    def __init__(self, seq, bit_start, steps, state0, position0, intervals_us, num_registers):
+        self.seq = tuple(seq)
+        self.bitStart = bit_start
+        self.steps = steps
+        self.state0 = state0
+        self.position0 = position0
+        self.numRegisters = num_registers
+        self.n = n = abs(steps)
+        self.dir = (steps > 0) - (steps < 0)
+        if isinstance(intervals_us, (int, float)):
+            intervals_us = [intervals_us]*n
+        self.intervals = list(intervals_us[:n])
+        if np is not None:
+            self.__planNumpy()
+        else:
+            self.__planPython()
+
+    def __planNumpy(self):
+        n, d, L = self.n, self.dir, len(self.seq)
+        k = np.arange(1, n + 1, dtype=np.int64)
+        states = (self.state0 + d*k) % L
+        patterns = np.asarray(self.seq, dtype=np.uint8)[states]
+        self.states = states.tolist()
+        self.patterns = patterns.tolist()
+        self.nibbles = (patterns << (self.bitStart % 8)).astype(np.uint8).tolist()
+        self.positions = (self.position0 + d*k).tolist()
+
+    def __planPython(self):
+        n, d, L = self.n, self.dir, len(self.seq)
+        seq, shift = self.seq, self.bitStart % 8
+        self.states = [(self.state0 + d*k) % L for k in range(1, n + 1)]
+        self.patterns = [seq[s] for s in self.states]
+        self.nibbles = [p << shift for p in self.patterns]
+        self.positions = [self.position0 + d*k for k in range(1, n + 1)]
+
+    # Check the move against the hardware before running it: the end
+    # position must fit the motor table, the motor's bits must be on the
+    # chain, and no step may come sooner than MIN_INTERVAL_US or (given
+    # max_rate [steps/s], e.g. the profile's vmax) faster than max_rate.
+    # Raises ValueError naming the first problem found.
+    def validate(self, max_rate=None):
+        n = self.n
+        if len(self.intervals) != n:
+            raise ValueError(f'{len(self.intervals)} step intervals for a {n}-step move')
+        if 8*self.numRegisters < self.bitStart + 4:
+            raise ValueError(f'bit {self.bitStart} is past the end of a {self.numRegisters}-register chain')
+        if n == 0:
+            return
+        end = self.position0 + self.steps
+        if not -2**31 <= end < 2**31:
+            raise ValueError(f'end position {end} does not fit the motor table')
+        shortest = min(self.intervals)
+        if shortest < MIN_INTERVAL_US:
+            raise ValueError(f'step interval {shortest:.1f} us is below the {MIN_INTERVAL_US} us floor')
+        if max_rate is not None and shortest < 1e6/max_rate*(1 - 1e-6):   # float slack in the profile tables
+            raise ValueError(f'step interval {shortest:.1f} us is faster than {max_rate:.1f} steps/s')
+
+
+# Trajectory for motor's move of steps (signed), from its current state in
+# the motor table, on a chain of num_registers registers:
+def plan_move(motor, steps, intervals_us, num_registers):
+    return Trajectory(motor.seq, motor.shifter_bit_start, steps,
+                      motor.row.state, motor.row.position, intervals_us, num_registers)
+
+
+# Combined frames for a coordinated move of several motors (see
+# MotionPlanner): plan[i] = (steps, dir) for motors[i]; after tick k,
+# motor i has taken floor((k+1)*n_i/N) steps, the same spread as adding
+# n_i to an error term every tick and stepping each time it passes N.
+# A motor's bits stay as they are in base_frame until its first step.
+# Returns the frames and every motor's final sequence state.
+def plan_axes(motors, plan, base_frame):
+    N = max(n for n, d in plan)
+    nr = len(base_frame)
+    frame = int.from_bytes(bytes(base_frame), 'little')
+    base = frame
+    moving = [(m, n, d) for m, (n, d) in zip(motors, plan) if n]
+    for m, n, d in moving:
+        base &= ~(0b1111 << m.shifter_bit_start)
+    if np is not None:
+        k = np.arange(1, N + 1, dtype=np.int64)
+        words = np.full(N, base, dtype=np.uint64)
+        for m, n, d in moving:
+            taken = (k*n)//N
+            pattern = np.asarray(m.seq, dtype=np.uint64)[(m.row.state + d*taken) % len(m.seq)]
+            pattern[taken == 0] = (frame >> m.shifter_bit_start) & 0b1111
+            words |= pattern << np.uint64(m.shifter_bit_start)
+        buf = words.astype('<u8').view(np.uint8).reshape(N, 8)[:, :nr].tobytes()
+        frames = [buf[i*nr:(i+1)*nr] for i in range(N)]
+    else:
+        frames = []
+        for k in range(1, N + 1):
+            w = base
+            for m, n, d in moving:
+                taken = (k*n)//N
+                if taken:
+                    w |= m.seq[(m.row.state + d*taken) % len(m.seq)] << m.shifter_bit_start
+                else:
+                    w |= frame & (0b1111 << m.shifter_bit_start)
+            frames.append(w.to_bytes(nr, 'little'))
+    finals = [(m.row.state + d*n) % len(m.seq) for m, (n, d) in zip(motors, plan)]
+    return frames, finals
+
+
+# Example:
+#
+# t = plan_move(m1, 512, Stepper.delay, 1)
+# t.validate()                  # before anything moves
+# print(t.positions[-1], sum(t.intervals)/1e3, 'ms')
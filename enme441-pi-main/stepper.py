@@ -4,7 +4,9 @@
 # Connect the stepper motor power to 5V rail pin on Pi
 
 from RPi import GPIO
+import sys
 import time
+from stepper_class_gpio_multiprocessing import Stepper   # for the drive mode tables
 
 GPIO.setmode(GPIO.BCM)
 
@@ -14,28 +16,23 @@ for p in pins:
 
 delay = 1200/1e6  # delay between steps
 
-# Define the pin sequence for CW motion:
-seq = [
-    0b0001,
-    0b0011,
-    0b0010,
-    0b0110,
-    0b0100,
-    0b1100,
-    0b1000,
-    0b1001
-    ]
+# Pin sequence for CW motion: half-step by default, or pass wave/full
+# on the command line (same tables as the Stepper class):
+mode = sys.argv[1] if len(sys.argv) > 1 else 'half'
+try:
+  seq, steps_per_rev = Stepper.mode(mode)
+except ValueError as e:
+  sys.exit(e)
 
 # Make a full rotation of the output shaft:
 def loop(dir):    # dir = 1 (cw) or -1 (ccw)
     pos = 0       # Track position in cw sequence
-    for i in range(512):            # 512 cycles/revolution
-        for halfstep in range(8):   # 8 half-steps per cycle
-            for j in range(4):      # Apply sequence to all pins
-                GPIO.output(pins[j],seq[pos] & 1<<j)
-            pos += dir         # move to next position in sequence
-            pos %= 8           # stay in [0,7] range
-            time.sleep(delay)  # need small delay between steps
+    for i in range(steps_per_rev):  # 4096 half-steps or 2048 full/wave steps per revolution
+        for j in range(4):          # Apply sequence to all pins
+            GPIO.output(pins[j],seq[pos] & 1<<j)
+        pos += dir         # move to next position in sequence
+        pos %= len(seq)    # stay in the sequence
+        time.sleep(delay)  # need small delay between steps
 try:
   loop(1)
   loop(-1)
@@ -8,6 +8,7 @@
 # WITHIN THE SUB-PROCESSES
 
 import time
+import traceback
 import multiprocessing
 from RPi import GPIO
 
@@ -20,15 +21,43 @@ class Stepper:
   seq = [0b0001,0b0011,0b0010,0b0110,0b0100,0b1100,0b1000,0b1001] # CCW sequence
   stepsPerDegree = 4096/360    # 4096 steps/rev * 1/360 rev/deg
 
-  def __init__(self, pins, lock, delay=1200):
+  # Drive modes: coil sequence and steps/rev (same tables as
+  # Lab8/drive_modes.py, kept here so this directory runs on its own).
+  # Wave drives one coil at a time, full two at a time (most torque,
+  # half the writes per rev), half alternates (twice the resolution).
+  modes = {
+    'wave': ([0b0001,0b0010,0b0100,0b1000], 2048),
+    'full': ([0b0011,0b0110,0b1100,0b1001], 2048),
+    'half': (seq, 4096),
+  }
+
+  # Coil sequence and steps/rev for a mode:
+  @staticmethod
+  def mode(name):
+    try:
+      return Stepper.modes[name]
+    except KeyError:
+      raise ValueError(f'unknown drive mode {name!r} (expected one of {tuple(Stepper.modes)})') from None
+
+  # gpio is the GPIO backend (RPi.GPIO by default; anything with the same
+  # calls works, e.g. the register-level MmapGPIO from gpio_backends.py)
+  #
+  # mode is the drive mode (see modes above): 'half', 'full' or 'wave'
+  def __init__(self, pins, delay=1200, gpio=GPIO, mode='half'):
+    seq, stepsPerRev = Stepper.mode(mode)
+    self.stepsPerDegree = stepsPerRev/360
+    # pin levels for every entry of the sequence, worked out once:
+    self.levels = [[(p >> idx) & 1 for idx in range(4)] for p in seq]
+    self.gpio = gpio
     self.delay = delay         # delay between motor steps [us]
     self.pins = pins           # motor drive pins (4-element list)
     self.angle = 0             # current output shaft angle
     self.seq_state = 0         # track position in sequence
-    self.lock = lock           # multiprocessing lock
+    self.queue = multiprocessing.JoinableQueue()   # moves waiting for the worker
+    self.latency = multiprocessing.Value('d', 0.0)  # dispatch to first step of the last move [s]
+    self.worker = None         # long-lived process that runs our moves in order
 
-    for p in self.pins:
-      GPIO.setup(p,GPIO.OUT)
+    self.gpio.setup(self.pins,self.gpio.OUT)   # as one group where the backend supports it
 
   # Signum function:
   def __sgn(self, x):
@@ -37,11 +66,11 @@ class Stepper:
 
   # Move a single +/-1 step in the motor sequence:
   def __step(self, dir):
-    seq = Stepper.seq[self.seq_state]
+    levels = self.levels[self.seq_state]
     self.seq_state += dir          # increment/decrement the step
-    self.seq_state %= 8            # ensure result stays in [0,7]
-    for idx in range(4):
-      GPIO.output(self.pins[idx], seq & 1<<idx)
+    self.seq_state %= len(self.levels)   # ensure result stays in the sequence
+    # all 4 coil pins in one call (a single set/clear store on MmapGPIO):
+    self.gpio.output(self.pins, levels)
 
     # THE FOLLOWING LINES WILL NOT ACTUALLY CHANGE THE ANGLE ATTRIBUTE! 
     # NOT A PROBLEM FOR RELATIVE MOVEMENT SINCE WE DON'T NEED TO KNOW
@@ -52,24 +81,49 @@ class Stepper:
     # INSTANCE ATTRIBUTE TO HOLD THE CURRENT ANGLE INSTEAD OF 
     # A REGULAR FLOAT...
     #
-    self.angle += dir/Stepper.stepsPerDegree
+    self.angle += dir/self.stepsPerDegree
     self.angle %= 360              # limit to [0,359.9+] range
 
   # Move relative angle from current position:
-  def __rotate(self, delta, lock):
-    lock.acquire()                 # wait until the lock is available
-    numSteps = int(Stepper.stepsPerDegree * abs(delta))    # find the right # of steps
+  def __rotate(self, delta, queued=None):
+    numSteps = int(self.stepsPerDegree * abs(delta))    # find the right # of steps
     dir = self.__sgn(delta)        # find the direction (+/-1)
+    if queued is not None:
+      self.latency.value = time.monotonic() - queued
     for s in range(numSteps):      # take the steps
       self.__step(dir)
       time.sleep(self.delay/1e6)
-    lock.release()
 
-  # Move relative angle from current position:
+  # Worker process: run queued moves one after another. Since the same
+  # process takes every step, self.angle stays correct in here, and no
+  # lock is needed to keep this motor's moves apart. Latency counts from
+  # when the move could start (rotate(), or the end of the move it was
+  # queued behind), so it doesn't include the earlier moves' run time.
+  def __work(self):
+    free = 0.0                     # when the last move finished
+    while True:
+      delta, queued = self.queue.get()
+      try:
+        self.__rotate(delta, max(queued, free))
+      except Exception:
+        traceback.print_exc()      # report a bad move, keep running the queue
+      finally:
+        free = time.monotonic()
+        self.queue.task_done()
+
+  # Move relative angle from current position. The move is queued for
+  # the worker (started on the first move) instead of forking a new
+  # process per move, so this returns right away:
   def rotate(self, delta):
-    time.sleep(0.1)
-    p = multiprocessing.Process(target=self.__rotate, args=(delta,self.lock))
-    p.start()
+    if self.worker is None:
+      self.worker = multiprocessing.Process(target=self.__work, daemon=True)
+      self.worker.start()
+    self.queue.put((delta, time.monotonic()))
+
+  # Block until all queued moves are done:
+  def wait(self):
+    if self.worker is not None:
+      self.queue.join()
 
   # Move to an absolute angle taking the shortest possible path:
   def goAngle(self, angle):
@@ -85,14 +139,10 @@ class Stepper:
 
 if __name__ == '__main__':
 
-  # Use multiprocessing.Lock() to prevent a single motor from trying to 
-  # execute multiple operations at the same time:
-  lock1 = multiprocessing.Lock()
-  lock2 = multiprocessing.Lock()
-
-  # Instantiate 2 Steppers:
-  m1 = Stepper([6,13,19,26], lock1)
-  m2 = Stepper([12,16,20,21], lock2)
+  # Instantiate 2 Steppers. Each runs its moves one at a time in its own
+  # worker, so a motor never tries to execute two operations at once:
+  m1 = Stepper([6,13,19,26])
+  m2 = Stepper([12,16,20,21])
 
   # Zero the motors:
   m1.zero()
@@ -109,3 +159,7 @@ if __name__ == '__main__':
   m2.rotate(-90)
   m2.rotate(145)
 
+  m1.wait()
+  m2.wait()
+  print(f'dispatch to first step: {1e3*m1.latency.value:.1f} ms, {1e3*m2.latency.value:.1f} ms')
+
@@ -2,10 +2,18 @@
 #
 # Use a simple HTML button to allow user to turn a GPIO output on/off
 
-from RPi import GPIO
+import sys
 from time import sleep
 import socket
 
+# Run with --mmap to drive the pin straight through the GPIO registers
+# (needs gpio_backends.py from Lab8 alongside this file):
+if '--mmap' in sys.argv:
+    from gpio_backends import MmapGPIO
+    GPIO = MmapGPIO()
+else:
+    from RPi import GPIO
+
 led = 21
 GPIO.setmode(GPIO.BCM)
 GPIO.setup(led, GPIO.OUT)
@@ -3,7 +3,6 @@
 # Display user-defined byte on LED bar
 
 
-import RPi.GPIO as gpio
 import threading
 from time import sleep
 import socket
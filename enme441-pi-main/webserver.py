@@ -7,8 +7,16 @@
 #
 # Must run as sudo to access port 80
 
+import sys
 import socket
-import RPi.GPIO as GPIO
+
+# Run with --mmap to read the pins straight from the GPIO registers
+# (needs gpio_backends.py from Lab8 alongside this file):
+if '--mmap' in sys.argv:
+    from gpio_backends import MmapGPIO
+    GPIO = MmapGPIO()
+else:
+    import RPi.GPIO as GPIO
 
 GPIO.setmode(GPIO.BCM)
 
@@ -17,7 +25,11 @@ for p in pins: GPIO.setup(p, GPIO.IN)
 
 # Generate HTML for the web page:
 def web_page():
-    rows = [f'<tr><td>{str(p)}</td><td>{GPIO.input(p)}</td></tr>' for p in pins]
+    if hasattr(GPIO, 'readPins'):   # all levels from one register load
+        levels = GPIO.readPins(pins)
+    else:
+        levels = [GPIO.input(p) for p in pins]
+    rows = [f'<tr><td>{str(p)}</td><td>{v}</td></tr>' for p, v in zip(pins, levels)]
     html = """
         <html>
         <head> <title>GPIO Pins</title> </head>